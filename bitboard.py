@@ -0,0 +1,294 @@
+from pieces import (
+    MANDRILL,
+    PYTHON,
+    GIRAFFE,
+    MEERKAT,
+    TORTOISE,
+    CARACAL,
+    BABOON,
+    QUIET_MOVES,
+    CAPTURE_MOVES,
+    QUIET_EVOLVE_MOVES,
+    CAPTURE_EVOLVE_MOVES,
+)
+
+# Bitboards use bit row * 8 + col. Board.bitboards is indexed by piece code + 8,
+# so White pieces sit at 9..15 and Black pieces at 1..7.
+CODE_OFFSET = 8
+FULL = (1 << 64) - 1
+
+
+def _bit(row, col):
+    if 0 <= row < 8 and 0 <= col < 8:
+        return 1 << (row * 8 + col)
+    return 0
+
+
+def _squares():
+    return [(square >> 3, square & 7) for square in range(64)]
+
+
+# Move triples indexed by bit, shared with the 0x88 generators in pieces.py.
+QUIET = [QUIET_MOVES[row * 16 + col] for row, col in _squares()]
+CAPTURE = [CAPTURE_MOVES[row * 16 + col] for row, col in _squares()]
+QUIET_EVOLVE = [QUIET_EVOLVE_MOVES[row * 16 + col] for row, col in _squares()]
+CAPTURE_EVOLVE = [CAPTURE_EVOLVE_MOVES[row * 16 + col] for row, col in _squares()]
+
+ROW_MASKS = [sum(1 << (row * 8 + col) for col in range(8)) for row in range(8)]
+
+TORTOISE_STEPS = [
+    sum(
+        _bit(row + dr, col + dc)
+        for dr in (-1, 0, 1)
+        for dc in (-1, 0, 1)
+        if dr or dc
+    )
+    for row, col in _squares()
+]
+ORTHOGONAL_STEPS = [
+    sum(_bit(row + dr, col + dc) for dr, dc in ((1, 0), (0, 1), (-1, 0), (0, -1)))
+    for row, col in _squares()
+]
+MEERKAT_STEPS = [
+    sum(
+        _bit(row + dr * i, col + dc * i)
+        for dr, dc in ((1, 0), (0, 1), (-1, 0), (0, -1))
+        for i in range(1, 4)
+    )
+    for row, col in _squares()
+]
+
+# Mandrill tables are indexed by color: 0 for Black (moving up), 1 for White (moving down).
+MANDRILL_PUSHES = [
+    [_bit(row + direction, col) for row, col in _squares()] for direction in (-1, 1)
+]
+MANDRILL_DOUBLE_PUSHES = [
+    [_bit(row + 2 * direction, col) if row == start else 0 for row, col in _squares()]
+    for direction, start in ((-1, 6), (1, 1))
+]
+MANDRILL_DIAGONALS = [
+    [_bit(row + direction, col - 1) | _bit(row + direction, col + 1) for row, col in _squares()]
+    for direction in (-1, 1)
+]
+EVOLVE_ROWS = [ROW_MASKS[0], ROW_MASKS[7]]
+
+# Rays for the sliding pieces. Directions with a positive bit step find their
+# first blocker at the lowest set bit, the others at the highest set bit.
+NORTH, SOUTH, EAST, WEST = (-1, 0), (1, 0), (0, 1), (0, -1)
+NORTH_EAST, NORTH_WEST, SOUTH_EAST, SOUTH_WEST = (-1, 1), (-1, -1), (1, 1), (1, -1)
+POSITIVE_DIRECTIONS = [SOUTH, EAST, SOUTH_EAST, SOUTH_WEST]
+NEGATIVE_DIRECTIONS = [NORTH, WEST, NORTH_EAST, NORTH_WEST]
+
+
+def _ray(row, col, direction, limit=7):
+    ray = 0
+    for i in range(1, limit + 1):
+        ray |= _bit(row + direction[0] * i, col + direction[1] * i)
+    return ray
+
+
+RAYS = {
+    direction: [_ray(row, col, direction) for row, col in _squares()]
+    for direction in POSITIVE_DIRECTIONS + NEGATIVE_DIRECTIONS
+}
+GIRAFFE_FORWARD_RAYS = [_ray(row, col, SOUTH, limit=2) for row, col in _squares()]
+
+
+def _python_table():
+    """Precomputes the Python's zig-zag for every square and direction.
+
+    Each direction uses the near left and right squares (L1, R1), the square two
+    steps ahead (C2) and the far left and right squares (L3, R3). Which squares
+    can be reached only depends on whether L1, R1 and C2 are empty, so every
+    entry holds (L1, R1, C2, reach) where reach maps that 3-bit pattern to the
+    reachable squares.
+    """
+    table = []
+    for row, col in _squares():
+        entries = []
+        for dr, dc in ((1, 0), (0, 1), (-1, 0), (0, -1)):
+            l1 = _bit(row + dr + dc, col + dc + dr)
+            r1 = _bit(row + dr - dc, col + dc - dr)
+            c2 = _bit(row + 2 * dr, col + 2 * dc)
+            l3 = _bit(row + 3 * dr + dc, col + 3 * dc + dr)
+            r3 = _bit(row + 3 * dr - dc, col + 3 * dc - dr)
+            reach = []
+            for pattern in range(8):
+                l1_empty, r1_empty, c2_empty = pattern & 1, pattern & 2, pattern & 4
+                squares = l1 | r1
+                if l1_empty or r1_empty:
+                    squares |= c2
+                    if c2_empty:
+                        if l1_empty:
+                            squares |= l3
+                        if r1_empty:
+                            squares |= r3
+                reach.append(squares)
+            entries.append((l1, r1, c2, reach))
+        table.append(entries)
+    return table
+
+
+PYTHON_TABLE = _python_table()
+
+
+def positive_ray_attacks(square, occupied, direction):
+    """Gets the squares a slider reaches along a direction with increasing bit index."""
+    ray = RAYS[direction][square]
+    blockers = ray & occupied
+    if blockers:
+        blocker = (blockers & -blockers).bit_length() - 1
+        ray ^= RAYS[direction][blocker]
+    return ray
+
+
+def negative_ray_attacks(square, occupied, direction):
+    """Gets the squares a slider reaches along a direction with decreasing bit index."""
+    ray = RAYS[direction][square]
+    blockers = ray & occupied
+    if blockers:
+        blocker = blockers.bit_length() - 1
+        ray ^= RAYS[direction][blocker]
+    return ray
+
+
+def rook_attacks(square, occupied):
+    return (
+        positive_ray_attacks(square, occupied, SOUTH)
+        | positive_ray_attacks(square, occupied, EAST)
+        | negative_ray_attacks(square, occupied, NORTH)
+        | negative_ray_attacks(square, occupied, WEST)
+    )
+
+
+def bishop_attacks(square, occupied):
+    return (
+        positive_ray_attacks(square, occupied, SOUTH_EAST)
+        | positive_ray_attacks(square, occupied, SOUTH_WEST)
+        | negative_ray_attacks(square, occupied, NORTH_EAST)
+        | negative_ray_attacks(square, occupied, NORTH_WEST)
+    )
+
+
+def giraffe_attacks(square, occupied):
+    forward = GIRAFFE_FORWARD_RAYS[square]
+    blockers = forward & occupied
+    if blockers:
+        forward &= (blockers & -blockers) * 2 - 1
+    return (
+        forward
+        | positive_ray_attacks(square, occupied, EAST)
+        | negative_ray_attacks(square, occupied, WEST)
+    )
+
+
+def python_attacks(square, empty):
+    attacks = 0
+    for l1, r1, c2, reach in PYTHON_TABLE[square]:
+        pattern = (1 if l1 & empty else 0) | (2 if r1 & empty else 0) | (4 if c2 & empty else 0)
+        attacks |= reach[pattern]
+    return attacks
+
+
+def piece_attacks(code, square, occupied):
+    """Gets the target squares of a non-Mandrill piece, own pieces included.
+    Returns: int (bitboard of target squares)."""
+    if code == TORTOISE:
+        return TORTOISE_STEPS[square]
+    if code == MEERKAT:
+        return MEERKAT_STEPS[square]
+    if code == CARACAL:
+        return bishop_attacks(square, occupied) | ORTHOGONAL_STEPS[square]
+    if code == GIRAFFE:
+        return giraffe_attacks(square, occupied)
+    if code == BABOON:
+        return rook_attacks(square, occupied)
+    return python_attacks(square, FULL ^ occupied)
+
+
+def generate_moves(board, color, captures_only=False):
+    """Generates all possible moves for a color from the board's bitboards,
+    or only the captures if captures_only is set.
+    Returns: List[Tuple[Piece, Move]] (the same moves the Piece generators return)."""
+    moves = []
+    side = 1 if color == "White" else 0
+    sign = 1 if side else -1
+    own = board.occupancy[color]
+    enemy = board.occupancy["Black" if side else "White"]
+    occupied = own | enemy
+    empty = FULL ^ occupied
+    grid = board.grid
+    bitboards = board.bitboards
+
+    pieces = bitboards[MANDRILL * sign + CODE_OFFSET]
+    evolve_row = EVOLVE_ROWS[side]
+    while pieces:
+        low = pieces & -pieces
+        pieces ^= low
+        square = low.bit_length() - 1
+        piece = grid[square >> 3][square & 7]
+        if captures_only:
+            targets = MANDRILL_DIAGONALS[side][square] & enemy
+        else:
+            targets = MANDRILL_PUSHES[side][square] & empty
+            if targets:
+                targets |= MANDRILL_DOUBLE_PUSHES[side][square] & empty
+            targets |= MANDRILL_DIAGONALS[side][square] & (empty | enemy)
+        while targets:
+            target = targets & -targets
+            targets ^= target
+            to = target.bit_length() - 1
+            if target & enemy:
+                if target & evolve_row:
+                    moves.append((piece, CAPTURE_EVOLVE[to]))
+                moves.append((piece, CAPTURE[to]))
+            else:
+                if target & evolve_row:
+                    moves.append((piece, QUIET_EVOLVE[to]))
+                moves.append((piece, QUIET[to]))
+
+    allowed = enemy if captures_only else FULL ^ own
+    for code in (PYTHON, GIRAFFE, MEERKAT, TORTOISE, CARACAL, BABOON):
+        pieces = bitboards[code * sign + CODE_OFFSET]
+        while pieces:
+            low = pieces & -pieces
+            pieces ^= low
+            square = low.bit_length() - 1
+            piece = grid[square >> 3][square & 7]
+            targets = piece_attacks(code, square, occupied) & allowed
+            while targets:
+                target = targets & -targets
+                targets ^= target
+                to = target.bit_length() - 1
+                if target & enemy:
+                    moves.append((piece, CAPTURE[to]))
+                else:
+                    moves.append((piece, QUIET[to]))
+
+    return moves
+
+
+def square_attacked(board, square, color):
+    """Checks whether any piece of a color could capture on a square.
+    Returns: bool (True if the square is attacked)."""
+    side = 1 if color == "White" else 0
+    sign = 1 if side else -1
+    occupied = board.occupancy["White"] | board.occupancy["Black"]
+    bitboards = board.bitboards
+    target = 1 << square
+
+    # A Mandrill attacks the square from the diagonals behind it.
+    if MANDRILL_DIAGONALS[1 - side][square] & bitboards[MANDRILL * sign + CODE_OFFSET]:
+        return True
+    # These pieces move the same way in both directions, so look from the square itself.
+    for code in (TORTOISE, MEERKAT, CARACAL, BABOON):
+        if piece_attacks(code, square, occupied) & bitboards[code * sign + CODE_OFFSET]:
+            return True
+    for code in (PYTHON, GIRAFFE):
+        pieces = bitboards[code * sign + CODE_OFFSET]
+        while pieces:
+            low = pieces & -pieces
+            pieces ^= low
+            if piece_attacks(code, low.bit_length() - 1, occupied) & target:
+                return True
+    return False
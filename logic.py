@@ -1,12 +1,59 @@
 from abc import ABC, abstractmethod
 from typing import Literal
 import math
-from copy import deepcopy
+import time
+from copy import copy
+from array import array
 from pieces import Piece, Mandrill, Python, Caracal, Tortoise, Giraffe, Meerkat
+from pieces import BOARD_SQUARES, PIECE_VALUES, PIECE_LETTERS, MANDRILL, BABOON, TORTOISE
+from pieces import create_piece
+from bitboard import CODE_OFFSET
+import bitboard
+from search_stats import SearchStats
+from tablebase import TABLEBASE_WIN, MAX_DISTANCE
+from transposition import (
+    TranspositionTable,
+    piece_key,
+    ZOBRIST_BLACK_TO_MOVE,
+    EXACT,
+    LOWER_BOUND,
+    UPPER_BOUND,
+)
 
 
 Color = Literal["White", "Black"]  # black down, white up
 
+MAX_SEARCH_DEPTH = 64
+TIME_CHECK_INTERVAL = 256  # nodes between clock reads during a timed search
+QUIESCENCE_DELTA = 1  # margin for positional gains when pruning hopeless captures
+EVOLVE_GAIN = PIECE_VALUES[BABOON] - PIECE_VALUES[MANDRILL]
+KILLER_SLOTS = 2
+TORTOISE_CODES = {"White": TORTOISE, "Black": -TORTOISE}
+NULL_WINDOW = 0.001  # width of a null window, below the 0.01 evaluation step
+NULL_MOVE_REDUCTION = 2
+LMR_FULL_MOVES = 3  # moves searched at full depth before reductions start
+LMR_MIN_DEPTH = 3
+ASPIRATION_GROWTH = 4  # factor the window widens by after a failed search
+ASPIRATION_LIMIT = 10  # widest window before searching with an open bound
+# Score of capturing a Tortoise, less the plies it takes, above every tablebase score.
+WIN_SCORE = TABLEBASE_WIN + MAX_DISTANCE + 1
+
+# Evaluation terms of one piece, indexed by piece code + CODE_OFFSET. Black is the
+# maximizing side, so Black pieces count positive and White pieces negative.
+MATERIAL = [
+    PIECE_VALUES[-code] if code < 0 else -PIECE_VALUES[code]
+    for code in range(-CODE_OFFSET + 1, CODE_OFFSET)
+]
+MATERIAL.insert(0, 0)  # code -8 is unused
+# Mandrill and Baboon advancement in hundredths of a point, by row.
+ADVANCEMENT = [
+    [
+        (8 - row if code < 0 else -row) if abs(code) in (MANDRILL, BABOON) else 0
+        for row in range(8)
+    ]
+    for code in range(-CODE_OFFSET, CODE_OFFSET)
+]
+
 
 class Player:
     def __init__(self, color: Color):
@@ -26,10 +73,30 @@ class Game:
         self.current_turn = 1  # 0 for black, 1 for white
         self.board.setup()
         self.winner = None
-        self.history = [deepcopy(self.board.get_board_state())]
+        self.history = []  # (piece, from, to, captuwhite piece, evolved) per move
         self.moves_made = 0
         self.board_index = 0
         self.viewing_mode = False
+        self.tt = TranspositionTable()
+        self.nodes = 0
+        self.search_deadline = None
+        self.search_aborted = False
+        self.stop_requested = False
+        self.pv_moves = {}
+        self.root_search = None  # set to a RootParallelSearch to split the root over processes
+        self.debug_evaluation = False  # check the running totals against a full rescan
+        self.use_quiescence = True  # resolve captures at the leaves of minimax
+        self.killers = [[None] * KILLER_SLOTS for _ in range(MAX_SEARCH_DEPTH)]
+        self.history_scores = [0] * (8 * 64 * 64)  # by (piece code, from, to)
+        self.use_pvs = False  # search moves after the first with a null window
+        self.use_null_move = False  # try passing the turn to prove a cutoff
+        self.use_lmr = False  # reduce the depth of late quiet moves
+        self.in_null_move = False
+        self.aspiration_window = 0.25  # None searches every iteration with a full window
+        self.stats = SearchStats()
+        self.profile_search = False  # time move generation and evaluation into the stats
+        self.tablebases = None  # set to a Tablebases to look up endings with few pieces
+        self.legal_moves = None  # (board, hash, moves, moves by square) of the side to move
 
     def get_current_player(self):
         """Gets the current player based on turn.
@@ -54,25 +121,33 @@ class Game:
         if isinstance(captuwhite_piece, Tortoise):
             self.winner = self.get_current_player().get_color()
 
-    def record_state(self):
-        """Saves the current board state into the game history.
+    def record_state(self, piece, from_pos, to_pos, captuwhite_piece, evolved):
+        """Saves a move and what it captured into the game history.
         Returns: None."""
-        self.history.append(deepcopy(self.board.get_board_state()))
+        self.history.append((piece, from_pos, to_pos, captuwhite_piece, evolved))
 
     def step_back(self):
-        """Steps back to the previous state in the game history.
+        """Steps back to the previous state in the game history by undoing one move.
         Returns: None."""
         if self.board_index > 0:
             self.board_index -= 1
-            self.load_state(self.history[self.board_index])
+            piece, from_pos, to_pos, captuwhite_piece, evolved = self.history[
+                self.board_index
+            ]
+            self.undo_move(piece, from_pos, captuwhite_piece, evolved)
             self.viewing_mode = True
+            self.invalidate_legal_moves()
 
     def step_forward(self):
-        """Steps forward to the next state in the game history.
+        """Steps forward to the next state in the game history by replaying one move.
         Returns: None."""
         if self.board_index < self.moves_made:
+            piece, from_pos, to_pos, captuwhite_piece, evolved = self.history[
+                self.board_index
+            ]
+            self.board.move_piece(piece, to_pos, evolved)
             self.board_index += 1
-            self.load_state(self.history[self.board_index])
+            self.invalidate_legal_moves()
 
             if self.board_index == self.moves_made:
                 self.viewing_mode = False
@@ -80,25 +155,27 @@ class Game:
     def step_to_front(self):
         """Steps to the most recent state in the game history.
         Returns: None."""
-        if self.board_index != self.moves_made:
-            self.board_index = self.moves_made
-            self.load_state(self.history[self.board_index])
-            self.viewing_mode = False
+        while self.board_index < self.moves_made:
+            self.step_forward()
 
-    def load_state(self, state):
-        """Loads a given board state.
+    def load_board(self, board):
+        """Starts the game over from a given board, with its side to move.
         Returns: None."""
-        self.board.grid = [[deepcopy(cell) for cell in row] for row in state]
-        for row in range(8):
-            for col in range(8):
-                piece = self.board.grid[row][col]
-                if piece:
-                    piece.move((row, col))
+        self.board = board
+        self.current_turn = board.turn
+        self.winner = None
+        self.history = []
+        self.moves_made = 0
+        self.board_index = 0
+        self.viewing_mode = False
+        self.invalidate_legal_moves()
 
     def make_move(self, piece, move):
         """Moves a piece to a new position, checks for victory, and updates the game state.
         Returns: bool (True if the game ends after the move, otherwise False)."""
+        from_pos = piece.get_position()
         captuwhite_piece = self.board.move_piece(piece, move[2], move[1])
+        self.invalidate_legal_moves()
 
         if captuwhite_piece != None:
             self.check_victory(captuwhite_piece)
@@ -106,31 +183,82 @@ class Game:
         if self.winner:
             return True
 
-        self.record_state()
+        self.record_state(piece, from_pos, move[2], captuwhite_piece, move[1])
         self.switch_turn()
+        self.tt.new_search()
         return False
 
+    def invalidate_legal_moves(self):
+        """Forgets the cached moves of the side to move, after the position changed.
+        Returns: None."""
+        self.legal_moves = None
+
+    def cache_legal_moves(self, moves):
+        """Stores the moves of the side to move in the current position.
+        Returns: None."""
+        by_square = {}
+        for piece, move in moves:
+            by_square.setdefault(piece.get_position(), []).append(move)
+        self.legal_moves = (self.board, self.board.hash, moves, by_square)
+
+    def cached_legal_moves(self):
+        """Gets the cache of the side to move's moves, generating them on first use in
+        a position. Moves the search makes and takes back leave the cache in place,
+        and a cache left over from another board is never used.
+        Returns: Tuple[Board, int, List[Tuple[Piece, Move]], Dict[Position, List[Move]]]
+        (the board and hash it holds for, the moves and the moves by from-square)."""
+        cache = self.legal_moves
+        if cache is None or cache[0] is not self.board or cache[1] != self.board.hash:
+            color = "White" if self.board.turn == 1 else "Black"
+            self.cache_legal_moves(self.generate_moves(color))
+        return self.legal_moves
+
+    def get_legal_moves(self):
+        """Gets the moves of the side to move by the square of the piece making them,
+        for highlighting and click handling.
+        Returns: Dict[Position, List[Move]] (the moves of each piece that can move)."""
+        return self.cached_legal_moves()[3]
+
+    def get_root_moves(self):
+        """Gets the moves of the side to move for the root of a search, from the same
+        cache as get_legal_moves.
+        Returns: List[Tuple[Piece, Move]] (a new list of pieces and their moves, in
+        the order of generate_moves)."""
+        return list(self.cached_legal_moves()[2])
+
     def evaluate_board(self) -> float:
-        """Evaluates the board state using a heuristic function.
+        """Evaluates the board state from the running totals kept by the board.
+        Returns: float (the score of the board state)."""
+        self.stats.leaf_evaluations += 1
+        if self.profile_search:
+            start_time = time.perf_counter()
+            score = self.board.material + self.board.advancement * 0.01
+            self.stats.evaluate_seconds += time.perf_counter() - start_time
+        else:
+            score = self.board.material + self.board.advancement * 0.01
+        if self.debug_evaluation:
+            full_score = self.evaluate_board_full()
+            if not math.isclose(score, full_score, abs_tol=1e-9):
+                raise RuntimeError(
+                    f"Incremental evaluation {score} does not match full evaluation {full_score}."
+                )
+        return score
+
+    def evaluate_board_full(self) -> float:
+        """Evaluates the board state by scanning every square.
         Returns: float (the score of the board state)."""
         score = 0
-        for row in range(8):
-            for col in range(8):
-                piece = self.board.get_piece_at_pos((row, col))
-                if piece:
-                    if isinstance(piece, Mandrill):
-                        if piece.get_color() == "Black":
-                            x = 8 - row
-                            score += x * 0.01
-                        else:
-                            x = row
-                            score -= x * 0.01
-
-                    piece_score = self.get_value_of_piece(piece)
-                    if piece.get_color() == "Black":
-                        score += piece_score
-                    else:
-                        score -= piece_score
+        squares = self.board.squares
+        for square in BOARD_SQUARES:
+            code = squares[square]
+            if code > 0:
+                if code == MANDRILL or code == BABOON:
+                    score -= (square >> 4) * 0.01
+                score -= PIECE_VALUES[code]
+            elif code < 0:
+                if code == -MANDRILL or code == -BABOON:
+                    score += (8 - (square >> 4)) * 0.01
+                score += PIECE_VALUES[-code]
 
         return score
 
@@ -139,67 +267,514 @@ class Game:
         Returns: int (the piece's value)."""
         return piece.get_piece_value()
 
-    def minimax(self, depth: int, alpha: int, beta: int, maximizing_player: bool):
+    def minimax(
+        self, depth: int, alpha: int, beta: int, maximizing_player: bool, ply: int = 0
+    ):
         """Uses the minimax algorithm with alpha-beta pruning to evaluate the best move.
+        Positions already searched to the same depth are answered from the transposition table,
+        and positions below the root that are in the tablebases from the tables.
+        ply is the distance from the root, used for the killer moves and to prefer
+        the quickest Tortoise capture.
         Returns: Tuple[float, Tuple[Piece, Move]] (evaluation score and best move)."""
-        if depth == 0 or self.winner:
+        self.count_node()
+
+        if self.winner:
             return self.evaluate_board(), None
+        if ply > 0:
+            score = self.capture_score(ply)
+            if score is not None:
+                return score, None
+        if self.tablebases is not None and ply > 0:
+            score = self.tablebases.probe(self.board)
+            if score is not None:
+                return score, None
+        if depth == 0:
+            if self.use_quiescence:
+                return self.quiescence(alpha, beta, maximizing_player, ply), None
+            return self.evaluate_board(), None
+
+        key = self.board.hash
+        tt_move = None
+        entry = self.tt.probe(key)
+        if entry:
+            tt_move = entry[4]
+            # Only exact-depth hits cut off, so results never depend on what the table holds.
+            if entry[1] == depth:
+                score, flag = entry[2], entry[3]
+                if (
+                    flag == EXACT
+                    or (flag == LOWER_BOUND and score >= beta)
+                    or (flag == UPPER_BOUND and score <= alpha)
+                ):
+                    return score, self.resolve_move(tt_move)
+
+        if self.use_null_move and ply > 0 and depth > NULL_MOVE_REDUCTION:
+            score = self.null_move_search(depth, alpha, beta, maximizing_player, ply)
+            if score is not None:
+                return score, None
+
+        alpha_orig, beta_orig = alpha, beta
+        color = "Black" if maximizing_player else "White"
+        if ply == 0 and self.board.turn == (0 if maximizing_player else 1):
+            moves = self.get_root_moves()
+        else:
+            moves = self.generate_moves(color)
+        moves = self.order_moves(moves, key, tt_move, ply)
 
         best_move = None
+        best_from = None
         if maximizing_player:
-            max_eval = -math.inf
-            for piece, move in self.generate_moves("Black"):
+            best_eval = -math.inf
+            for index, (piece, move) in enumerate(moves):
                 old_pos = piece.get_position()
                 captuwhite_piece = self.apply_move(piece, move[2], move[1])
-                eval, _ = self.minimax(depth - 1, alpha, beta, False)
+                eval = self.search_child(depth, alpha, beta, True, ply, index, move)
                 self.undo_move(piece, old_pos, captuwhite_piece, move[1])
+                if self.search_aborted:
+                    return 0, None
 
-                if eval > max_eval:
-                    max_eval = eval
+                if eval > best_eval:
+                    best_eval = eval
                     best_move = (piece, move)
+                    best_from = old_pos
 
                 alpha = max(alpha, eval)
                 if beta <= alpha:
+                    self.stats.record_cutoff(index)
+                    self.record_cutoff(piece, old_pos, move, depth, ply)
                     break
-            return max_eval, best_move
         else:
-            min_eval = math.inf
-            for piece, move in self.generate_moves("White"):
+            best_eval = math.inf
+            for index, (piece, move) in enumerate(moves):
                 old_pos = piece.get_position()
                 captuwhite_piece = self.apply_move(piece, move[2], move[1])
-                eval, _ = self.minimax(depth - 1, alpha, beta, True)
+                eval = self.search_child(depth, alpha, beta, False, ply, index, move)
                 self.undo_move(piece, old_pos, captuwhite_piece, move[1])
+                if self.search_aborted:
+                    return 0, None
 
-                if eval < min_eval:
-                    min_eval = eval
+                if eval < best_eval:
+                    best_eval = eval
                     best_move = (piece, move)
+                    best_from = old_pos
 
                 beta = min(beta, eval)
                 if beta <= alpha:
+                    self.stats.record_cutoff(index)
+                    self.record_cutoff(piece, old_pos, move, depth, ply)
                     break
-            return min_eval, best_move
+
+        if best_eval <= alpha_orig:
+            flag = UPPER_BOUND
+        elif best_eval >= beta_orig:
+            flag = LOWER_BOUND
+        else:
+            flag = EXACT
+        stored_move = (best_from, best_move[1]) if best_move else None
+        self.tt.store(key, depth, best_eval, flag, stored_move)
+        return best_eval, best_move
+
+    def search_child(self, depth, alpha, beta, maximizing_player, ply, index, move):
+        """Searches the position after the index-th move of a node, which has already
+        been applied. maximizing_player is the side that made the move. With PVS every
+        move after the first is first searched with a null window, and with LMR late
+        quiet moves are first searched one ply shallower; either is searched again
+        in full if the result could change the best move.
+        Returns: float (evaluation score)."""
+        reduction = 0
+        if (
+            self.use_lmr
+            and index >= LMR_FULL_MOVES
+            and depth >= LMR_MIN_DEPTH
+            and not move[0]
+            and not move[1]
+        ):
+            reduction = 1
+        if index == 0 or not (self.use_pvs or reduction):
+            return self.minimax(depth - 1, alpha, beta, not maximizing_player, ply + 1)[0]
+
+        if not self.use_pvs:
+            window = (alpha, beta)
+        elif maximizing_player:
+            window = (alpha, alpha + NULL_WINDOW)
+        else:
+            window = (beta - NULL_WINDOW, beta)
+
+        if reduction:
+            self.stats.reduced_searches += 1
+            eval = self.minimax(depth - 2, *window, not maximizing_player, ply + 1)[0]
+            if self.search_aborted:
+                return eval
+            improves = eval > alpha if maximizing_player else eval < beta
+            if not improves:
+                return eval
+            self.stats.reduction_researches += 1
+
+        eval = self.minimax(depth - 1, *window, not maximizing_player, ply + 1)[0]
+        if self.use_pvs and alpha < eval < beta and not self.search_aborted:
+            self.stats.pvs_researches += 1
+            eval = self.minimax(depth - 1, alpha, beta, not maximizing_player, ply + 1)[0]
+        return eval
+
+    def null_move_search(self, depth, alpha, beta, maximizing_player, ply):
+        """Lets the side to move pass and searches the rest at reduced depth with a null
+        window. If the position is still good enough for a cutoff, a real move will be
+        too, so the node can be cut off. Skipped inside another null move search and
+        while the side to move's Tortoise is attacked.
+        Returns: float (the cutoff score, or None if the node has to be searched)."""
+        if self.in_null_move:
+            return None
+        color = "Black" if maximizing_player else "White"
+        opponent = "White" if maximizing_player else "Black"
+        tortoises = self.board.bitboards[TORTOISE_CODES[color] + CODE_OFFSET]
+        if not tortoises or bitboard.square_attacked(
+            self.board, tortoises.bit_length() - 1, opponent
+        ):
+            return None
+
+        self.in_null_move = True
+        self.board.switch_turn()
+        if maximizing_player:
+            window = (beta - NULL_WINDOW, beta)
+        else:
+            window = (alpha, alpha + NULL_WINDOW)
+        score = self.minimax(
+            depth - 1 - NULL_MOVE_REDUCTION, *window, not maximizing_player, ply + 1
+        )[0]
+        self.board.switch_turn()
+        self.in_null_move = False
+        if self.search_aborted:
+            return None
+        if (maximizing_player and score >= beta) or (not maximizing_player and score <= alpha):
+            self.stats.null_move_cutoffs += 1
+            return score
+        return None
+
+    def quiescence(
+        self, alpha: float, beta: float, maximizing_player: bool, ply: int = 0
+    ) -> float:
+        """Searches captures only until the position is quiet, so the evaluation is not
+        taken in the middle of an exchange. The side to move may always stand pat, and
+        captures that cannot bring the score back within the window are skipped.
+        Capturing a Tortoise ends the game, so nothing is searched after it.
+        Returns: float (evaluation score)."""
+        self.count_node()
+        stand_pat = self.evaluate_board()
+        if maximizing_player:
+            if stand_pat >= beta:
+                return stand_pat
+            alpha = max(alpha, stand_pat)
+        else:
+            if stand_pat <= alpha:
+                return stand_pat
+            beta = min(beta, stand_pat)
+
+        best_eval = stand_pat
+        color = "Black" if maximizing_player else "White"
+        for gain, piece, move in self.generate_captures(color):
+            # Captures are sorted by gain, so once one is hopeless the rest are too.
+            if maximizing_player and stand_pat + gain + QUIESCENCE_DELTA <= alpha:
+                break
+            if not maximizing_player and stand_pat - gain - QUIESCENCE_DELTA >= beta:
+                break
+
+            old_pos = piece.get_position()
+            captuwhite_piece = self.apply_move(piece, move[2], move[1])
+            if isinstance(captuwhite_piece, Tortoise):
+                eval = self.capture_score(ply + 1)
+            else:
+                eval = self.quiescence(alpha, beta, not maximizing_player, ply + 1)
+            self.undo_move(piece, old_pos, captuwhite_piece, move[1])
+            if self.search_aborted:
+                return 0
+
+            if maximizing_player:
+                best_eval = max(best_eval, eval)
+                alpha = max(alpha, eval)
+            else:
+                best_eval = min(best_eval, eval)
+                beta = min(beta, eval)
+            if beta <= alpha:
+                break
+
+        return best_eval
+
+    def capture_score(self, ply):
+        """Scores a position reached in the search after a Tortoise was captured, as a
+        win for the side that took it on the same scale as the tablebase scores.
+        Returns: float (the Black positive score, or None if both Tortoises are on the board)."""
+        bitboards = self.board.bitboards
+        if not bitboards[TORTOISE + CODE_OFFSET]:
+            return WIN_SCORE - ply
+        if not bitboards[CODE_OFFSET - TORTOISE]:
+            return ply - WIN_SCORE
+        return None
+
+    def count_node(self):
+        """Counts a searched node and, every TIME_CHECK_INTERVAL nodes, checks the deadline.
+        Returns: None."""
+        self.nodes += 1
+        if (
+            self.search_deadline is not None
+            and self.nodes % TIME_CHECK_INTERVAL == 0
+            and time.perf_counter() >= self.search_deadline
+        ):
+            self.search_aborted = True
+
+    def iterative_deepening(
+        self,
+        max_depth: int,
+        time_budget_ms: float,
+        maximizing_player: bool,
+        on_iteration=None,
+    ):
+        """Searches depth 1, 2, 3, ... until max_depth or the time budget runs out.
+        Each iteration tries the previous principal variation first. The first
+        iteration always completes so a move is available. on_iteration, if given,
+        is called with the depth, score and best move after every completed iteration.
+        A position in the tablebases is not searched, its best move is looked up.
+        The counters of the search are left in self.stats.
+        Returns: Tuple[float, Tuple[Piece, Move], int] (score, best move and depth of the
+        deepest completed iteration)."""
+        start_time = time.perf_counter()
+        deadline = start_time + time_budget_ms / 1000
+        self.tt.new_search()
+        self.nodes = 0
+        self.search_aborted = self.stop_requested
+        self.search_deadline = None
+        self.pv_moves = {}
+        self.clear_move_ordering()
+        self.stats = SearchStats()
+
+        best_score, best_move, completed_depth = None, None, 0
+        depths = range(1, max_depth + 1)
+        root_result = self.tablebases.best_move(self) if self.tablebases is not None else None
+        if root_result is not None:
+            best_score, best_move = root_result
+            completed_depth = 1
+            depths = ()
+            if on_iteration is not None:
+                on_iteration(1, best_score, best_move)
+
+        for depth in depths:
+            iteration_start = self.nodes
+            iteration_time = time.perf_counter()
+            score, move = self.aspiration_search(depth, maximizing_player, best_score)
+            if self.search_aborted:
+                break
+
+            self.stats.record_iteration(
+                self.nodes - iteration_start, time.perf_counter() - iteration_time
+            )
+            best_score, best_move, completed_depth = score, move, depth
+            self.pv_moves = self.get_principal_variation(depth)
+            if on_iteration is not None:
+                on_iteration(depth, score, move)
+            self.search_deadline = deadline
+            if best_move is None or time.perf_counter() >= deadline:
+                break
+
+        self.stats.nodes = self.nodes
+        self.stats.score = best_score
+        self.stats.principal_variation = list(self.pv_moves.values())
+        self.search_deadline = None
+        self.search_aborted = False
+        self.stop_requested = False
+        return best_score, best_move, completed_depth
+
+    def aspiration_search(self, depth: int, maximizing_player: bool, guess):
+        """Searches the root inside a window around the previous iteration's score.
+        When the score falls outside, that side of the window is widened and the
+        root searched again, until it is open. Parallel root searches always use
+        a full window.
+        Returns: Tuple[float, Tuple[Piece, Move]] (evaluation score and best move)."""
+        if guess is None or self.aspiration_window is None or self.root_search is not None:
+            return self.search_root(depth, maximizing_player)
+
+        low_width = high_width = self.aspiration_window
+        while True:
+            alpha = guess - low_width if low_width < ASPIRATION_LIMIT else -math.inf
+            beta = guess + high_width if high_width < ASPIRATION_LIMIT else math.inf
+            score, move = self.search_root(depth, maximizing_player, alpha, beta)
+            if self.search_aborted:
+                return score, move
+            if score <= alpha and alpha != -math.inf:
+                self.stats.fail_lows += 1
+                low_width *= ASPIRATION_GROWTH
+            elif score >= beta and beta != math.inf:
+                self.stats.fail_highs += 1
+                high_width *= ASPIRATION_GROWTH
+            else:
+                return score, move
+
+    def search_root(
+        self, depth: int, maximizing_player: bool, alpha=-math.inf, beta=math.inf
+    ):
+        """Searches the current position to a fixed depth, in parallel if a root search is set.
+        Parallel root searches ignore the window.
+        Returns: Tuple[float, Tuple[Piece, Move]] (evaluation score and best move)."""
+        if self.root_search is not None:
+            return self.root_search.search(self, depth, maximizing_player)
+        return self.minimax(depth, alpha, beta, maximizing_player)
+
+    def stop_search(self):
+        """Asks a running search to stop as soon as possible. Safe to call from another thread.
+        Returns: None."""
+        self.stop_requested = True
+        self.search_aborted = True
+
+    def copy_for_search(self):
+        """Creates a copy of the game that can be searched while this one is drawn.
+        The copy shares the transposition table but not the history, and starts with
+        the cached moves of the side to move if they were generated for this position.
+        Returns: Game (a game with a copy of the current board)."""
+        game = copy(self)
+        game.board = Board.from_bytes(self.board.to_bytes())
+        game.history = []
+        game.pv_moves = {}
+        game.legal_moves = None
+        cache = self.legal_moves
+        if cache is not None and cache[0] is self.board and cache[1] == self.board.hash:
+            # The copy has its own pieces, so carry the moves over to them.
+            board = game.board
+            game.cache_legal_moves(
+                [(board.get_piece_at_pos(piece.get_position()), move) for piece, move in cache[2]]
+            )
+        game.search_aborted = False
+        game.stop_requested = False
+        return game
+
+    def get_principal_variation(self, depth: int):
+        """Follows the best moves stored in the transposition table from the current position,
+        stopping at a position already on the line, whose moves would only repeat.
+        Returns: Dict[int, Tuple[Position, Move]] (the principal variation keyed by position
+        hash, in the order the moves are played)."""
+        pv_moves = {}
+        played = []
+        for _ in range(depth):
+            if self.board.hash in pv_moves:
+                break
+            entry = self.tt.probe(self.board.hash)
+            if entry is None or entry[4] is None:
+                break
+            from_pos, move = entry[4]
+            piece = self.board.get_piece_at_pos(from_pos)
+            side = "White" if self.board.turn == 1 else "Black"
+            if (
+                piece is None
+                or piece.get_color() != side
+                or move not in piece.get_possible_moves(from_pos, self.board)
+            ):
+                break
+            pv_moves[self.board.hash] = entry[4]
+            played.append((piece, from_pos, self.apply_move(piece, move[2], move[1]), move[1]))
+
+        for piece, from_pos, captuwhite_piece, evolved in reversed(played):
+            self.undo_move(piece, from_pos, captuwhite_piece, evolved)
+        return pv_moves
+
+    def resolve_move(self, stored_move):
+        """Turns a move stored in the transposition table back into a piece and move.
+        Returns: Tuple[Piece, Move] (the piece and its move, or None if nothing was stored)."""
+        if stored_move is None:
+            return None
+        from_pos, move = stored_move
+        return self.board.get_piece_at_pos(from_pos), move
+
+    def order_moves(self, moves, key, tt_move, ply=0):
+        """Orders moves for the search: the principal variation move, the transposition
+        table move, captures by most valuable victim and least valuable attacker,
+        evolutions, the killer moves of this ply, then quiet moves by history score.
+        Returns: List[Tuple[Piece, Move]] (the reordered moves)."""
+        squares = self.board.squares
+        history_scores = self.history_scores
+        killers = self.killers[ply] if ply < MAX_SEARCH_DEPTH else []
+
+        def priority(piece_move):
+            piece, (capture, evolve, (to_row, to_col)) = piece_move
+            if capture:
+                victim = PIECE_VALUES[abs(squares[to_row * 16 + to_col])]
+                if evolve:
+                    victim += EVOLVE_GAIN
+                return (3, victim * 128 - PIECE_VALUES[piece.code])
+            if evolve:
+                return (2, 0)
+            from_row, from_col = piece.get_position()
+            stored_move = ((from_row, from_col), piece_move[1])
+            if stored_move in killers:
+                return (1, -killers.index(stored_move))
+            index = (piece.code << 12) | (from_row * 8 + from_col) << 6 | (to_row * 8 + to_col)
+            return (0, history_scores[index])
+
+        moves.sort(key=priority, reverse=True)
+        if tt_move:
+            self.move_to_front(moves, tt_move)
+        pv_move = self.pv_moves.get(key)
+        if pv_move:
+            self.move_to_front(moves, pv_move)
+        return moves
+
+    def record_cutoff(self, piece, from_pos, move, depth, ply):
+        """Remembers a quiet move that caused a cutoff as a killer move for its ply
+        and raises its history score.
+        Returns: None."""
+        if move[0]:
+            return
+        if ply < MAX_SEARCH_DEPTH:
+            killers = self.killers[ply]
+            stored_move = (from_pos, move)
+            if killers[0] != stored_move:
+                killers[1:] = killers[:-1]
+                killers[0] = stored_move
+        to_row, to_col = move[2]
+        index = (piece.code << 12) | (from_pos[0] * 8 + from_pos[1]) << 6 | (to_row * 8 + to_col)
+        self.history_scores[index] += depth * depth
+
+    def clear_move_ordering(self):
+        """Forgets the killer moves and history scores of earlier searches.
+        Returns: None."""
+        self.killers = [[None] * KILLER_SLOTS for _ in range(MAX_SEARCH_DEPTH)]
+        self.history_scores = [0] * (8 * 64 * 64)
+
+    def move_to_front(self, moves, stored_move):
+        """Moves the stored best move to the front of a generated move list.
+        Returns: None."""
+        from_pos, stored = stored_move
+        for index, (piece, move) in enumerate(moves):
+            if move == stored and piece.get_position() == from_pos:
+                moves.insert(0, moves.pop(index))
+                return
 
     def generate_moves(self, color: Color):
-        """Generates all possible moves for a given color.
+        """Generates all possible moves for a given color, unordered; the search
+        orders them with order_moves.
         Returns: List[Tuple[Piece, Move]] (a list of pieces and their possible moves).
         """
-        moves = []
-        for row in range(8):
-            for col in range(8):
-                piece = self.board.get_piece_at_pos((row, col))
-                if piece and piece.get_color() == color:
-                    possible_moves = piece.get_possible_moves((row, col), self.board)
-                    for move in possible_moves:
-                        moves.append((piece, move))
-        moves.sort(
-            key=lambda move: (
-                not move[1][0],
-                not move[1][1],
-                isinstance(move[0], Mandrill),
-            )
-        )
+        if self.profile_search:
+            start_time = time.perf_counter()
+        moves = bitboard.generate_moves(self.board, color)
+        if self.profile_search:
+            self.stats.generate_seconds += time.perf_counter() - start_time
         return moves
 
+    def generate_captures(self, color: Color):
+        """Generates the captures for a given color, most valuable gain first.
+        Returns: List[Tuple[int, Piece, Move]] (material gained, piece and move for each capture)."""
+        if self.profile_search:
+            start_time = time.perf_counter()
+        squares = self.board.squares
+        captures = []
+        for piece, move in bitboard.generate_moves(self.board, color, captures_only=True):
+            to_row, to_col = move[2]
+            gain = PIECE_VALUES[abs(squares[to_row * 16 + to_col])]
+            if move[1]:
+                gain += EVOLVE_GAIN
+            captures.append((gain, piece, move))
+        captures.sort(key=lambda capture: -capture[0])
+        if self.profile_search:
+            self.stats.generate_seconds += time.perf_counter() - start_time
+        return captures
+
     def apply_move(self, piece, position, evolved):
         """Applies a move and returns any captuwhite piece.
         Returns: Piece (the captuwhite piece, or None if no piece was captuwhite)."""
@@ -211,11 +786,13 @@ class Game:
         """Reverts a move to restore the previous game state.
         Returns: None."""
         old_position = piece.get_position()
+        self.board.remove_piece(old_position)
         if evolved:
             piece.devolve()
-        self.board.move_piece(piece, new_position, 0)
+        self.board.place_piece(piece, new_position)
         if captuwhite_piece:
             self.board.place_piece(captuwhite_piece, old_position)
+        self.board.switch_turn()
 
     def board_state(self):
         """Gets the current state of the board.
@@ -226,33 +803,167 @@ class Game:
 class Board:
     def __init__(self):
         self.grid = [[None for _ in range(8)] for _ in range(8)]
+        self.squares = array("b", bytes(128))  # 0x88 board of piece codes
+        self.piece_lists = {"White": {}, "Black": {}}  # square -> Piece
+        self.bitboards = [0] * 16  # indexed by piece code + 8
+        self.occupancy = {"White": 0, "Black": 0}
+        self.turn = 1  # 0 for black, 1 for white, mirrors Game.current_turn
+        self.hash = 0
+        self.material = 0
+        self.advancement = 0  # in hundredths of a point
 
     def setup(self):
         """Initializes the board with pieces in their starting positions.
         Returns: None."""
         for col in range(8):
-            self.grid[1][col] = Mandrill(color="White", initial_position=(1, col))
+            self.place_piece(Mandrill(color="White", initial_position=(1, col)), (1, col))
 
-        self.grid[0][0] = Meerkat(color="White", initial_position=(0, 0))
-        self.grid[0][1] = Python(color="White", initial_position=(0, 1))
-        self.grid[0][2] = Caracal(color="White", initial_position=(0, 2))
-        self.grid[0][3] = Tortoise(color="White", initial_position=(0, 3))
-        self.grid[0][4] = Giraffe(color="White", initial_position=(0, 4))
-        self.grid[0][5] = Caracal(color="White", initial_position=(0, 5))
-        self.grid[0][6] = Python(color="White", initial_position=(0, 6))
-        self.grid[0][7] = Meerkat(color="White", initial_position=(0, 7))
+        back_row = [Meerkat, Python, Caracal, Tortoise, Giraffe, Caracal, Python, Meerkat]
+        for col, piece_class in enumerate(back_row):
+            self.place_piece(piece_class(color="White", initial_position=(0, col)), (0, col))
 
         for col in range(8):
-            self.grid[6][col] = Mandrill(color="Black", initial_position=(6, col))
+            self.place_piece(Mandrill(color="Black", initial_position=(6, col)), (6, col))
+
+        back_row = [Meerkat, Python, Caracal, Giraffe, Tortoise, Caracal, Python, Meerkat]
+        for col, piece_class in enumerate(back_row):
+            self.place_piece(piece_class(color="Black", initial_position=(7, col)), (7, col))
+
+    def rebuild(self):
+        """Recomputes the square array, piece lists, hash and evaluation totals from the grid.
+        Returns: None."""
+        self.squares = array("b", bytes(128))
+        self.piece_lists = {"White": {}, "Black": {}}
+        self.bitboards = [0] * 16
+        self.occupancy = {"White": 0, "Black": 0}
+        self.hash = ZOBRIST_BLACK_TO_MOVE if self.turn == 0 else 0
+        self.material = 0
+        self.advancement = 0
+        for row in range(8):
+            for col in range(8):
+                piece = self.grid[row][col]
+                if piece:
+                    square = row * 16 + col
+                    bit = 1 << (row * 8 + col)
+                    code = piece.get_board_code()
+                    self.squares[square] = code
+                    self.piece_lists[piece.get_color()][square] = piece
+                    self.bitboards[code + CODE_OFFSET] |= bit
+                    self.occupancy[piece.get_color()] |= bit
+                    self.hash ^= piece_key(piece, (row, col))
+                    self.material += MATERIAL[code + CODE_OFFSET]
+                    self.advancement += ADVANCEMENT[code + CODE_OFFSET][row]
+
+    def to_codes(self) -> bytes:
+        """Packs the board into 64 piece codes, row by row, followed by the side to move.
+        Returns: bytes (65 bytes)."""
+        codes = array("b", [self.squares[square] for square in BOARD_SQUARES])
+        return codes.tobytes() + bytes([self.turn])
 
-        self.grid[7][0] = Meerkat(color="Black", initial_position=(7, 0))
-        self.grid[7][1] = Python(color="Black", initial_position=(7, 1))
-        self.grid[7][2] = Caracal(color="Black", initial_position=(7, 2))
-        self.grid[7][3] = Giraffe(color="Black", initial_position=(7, 3))
-        self.grid[7][4] = Tortoise(color="Black", initial_position=(7, 4))
-        self.grid[7][5] = Caracal(color="Black", initial_position=(7, 5))
-        self.grid[7][6] = Python(color="Black", initial_position=(7, 6))
-        self.grid[7][7] = Meerkat(color="Black", initial_position=(7, 7))
+    @classmethod
+    def from_codes(cls, data: bytes):
+        """Creates a board from the output of to_codes.
+        Returns: Board (the unpacked board)."""
+        if len(data) != 65:
+            raise ValueError(f"Board codes must be 65 bytes, got {len(data)}.")
+        return cls.from_code_list(array("b", data[:64]), data[64])
+
+    @classmethod
+    def from_code_list(cls, codes, turn: int):
+        """Creates a board from 64 piece codes, row by row, and the side to move.
+        Returns: Board (the new board)."""
+        if len(codes) != 64 or any(abs(code) > BABOON for code in codes):
+            raise ValueError(f"Board must be 64 piece codes from {-BABOON} to {BABOON}.")
+        if turn not in (0, 1):
+            raise ValueError(f"Side to move must be 0 or 1, got {turn}.")
+        board = cls()
+        for index, code in enumerate(codes):
+            if code:
+                position = (index >> 3, index & 7)
+                board.place_piece(create_piece(code, position), position)
+        if turn != board.turn:
+            board.switch_turn()
+        return board
+
+    def to_bytes(self) -> bytes:
+        """Packs the board into 33 bytes: two squares per byte, row by row, each a
+        4-bit two's complement piece code, followed by the side to move.
+        Returns: bytes (33 bytes)."""
+        squares = self.squares
+        packed = bytearray(33)
+        for index in range(32):
+            square = (index >> 2) * 16 + (index & 3) * 2
+            packed[index] = (squares[square] & 15) << 4 | (squares[square + 1] & 15)
+        packed[32] = self.turn
+        return bytes(packed)
+
+    @classmethod
+    def from_bytes(cls, data: bytes):
+        """Creates a board from the output of to_bytes.
+        Returns: Board (the unpacked board)."""
+        if len(data) != 33:
+            raise ValueError(f"Packed board must be 33 bytes, got {len(data)}.")
+        codes = []
+        for byte in data[:32]:
+            high, low = byte >> 4, byte & 15
+            codes.append(high - 16 if high > 7 else high)
+            codes.append(low - 16 if low > 7 else low)
+        return cls.from_code_list(codes, data[32])
+
+    def to_fen(self) -> str:
+        """Writes the board in position notation: the rows from 7 down to 0 separated
+        by "/", each listing pieces by letter (upper case White, lower case Black:
+        m mandrill, b baboon, p python, g giraffe, k meerkat, t tortoise, c caracal)
+        and runs of empty squares by count, then "w" or "b" for the side to move.
+        Returns: str (e.g. the start position "kpcgtcpk/mmmmmmmm/8/8/8/8/MMMMMMMM/KPCTGCPK w")."""
+        squares = self.squares
+        rows = []
+        for row in range(7, -1, -1):
+            text = ""
+            empty = 0
+            for col in range(8):
+                code = squares[row * 16 + col]
+                if not code:
+                    empty += 1
+                    continue
+                if empty:
+                    text += str(empty)
+                    empty = 0
+                text += PIECE_LETTERS[code].upper() if code > 0 else PIECE_LETTERS[-code]
+            if empty:
+                text += str(empty)
+            rows.append(text)
+        return "/".join(rows) + (" w" if self.turn == 1 else " b")
+
+    @classmethod
+    def from_fen(cls, text: str):
+        """Creates a board from position notation written by to_fen.
+        Returns: Board (the new board)."""
+        fields = text.split()
+        rows = fields[0].split("/") if fields else []
+        if len(fields) != 2 or fields[1] not in ("w", "b") or len(rows) != 8:
+            raise ValueError(f"Invalid position notation: {text!r}.")
+        codes = [0] * 64
+        for row, row_text in zip(range(7, -1, -1), rows):
+            col = 0
+            for letter in row_text:
+                if letter in "12345678":
+                    col += int(letter)
+                    continue
+                code = PIECE_LETTERS.find(letter.lower())
+                if code < 1 or col > 7:
+                    raise ValueError(f"Invalid position notation: {text!r}.")
+                codes[row * 8 + col] = code if letter.isupper() else -code
+                col += 1
+            if col != 8:
+                raise ValueError(f"Invalid position notation: {text!r}.")
+        return cls.from_code_list(codes, 1 if fields[1] == "w" else 0)
+
+    def switch_turn(self):
+        """Passes the move to the other side and updates the hash.
+        Returns: None."""
+        self.turn = 1 - self.turn
+        self.hash ^= ZOBRIST_BLACK_TO_MOVE
 
     def get_board_state(self):
         """Gets the current state of the board.
@@ -268,22 +979,53 @@ class Board:
             False
 
     def place_piece(self, piece, position):
-        """Places a piece at the specified position.
+        """Places a piece at the specified position, replacing any piece already there.
         Returns: None."""
+        occupant = self.grid[position[0]][position[1]]
+        if occupant:
+            self.remove_piece(position)
+        square = position[0] * 16 + position[1]
+        bit = 1 << (position[0] * 8 + position[1])
+        code = piece.get_board_code()
         self.grid[position[0]][position[1]] = piece
+        self.squares[square] = code
+        self.piece_lists[piece.get_color()][square] = piece
+        self.bitboards[code + CODE_OFFSET] |= bit
+        self.occupancy[piece.get_color()] |= bit
         piece.move(position)
+        self.hash ^= piece_key(piece, position)
+        self.material += MATERIAL[code + CODE_OFFSET]
+        self.advancement += ADVANCEMENT[code + CODE_OFFSET][position[0]]
+
+    def remove_piece(self, position):
+        """Removes the piece at the specified position.
+        Returns: Piece (the removed piece, or None if the position was empty)."""
+        piece = self.grid[position[0]][position[1]]
+        if piece:
+            square = position[0] * 16 + position[1]
+            bit = 1 << (position[0] * 8 + position[1])
+            self.grid[position[0]][position[1]] = None
+            self.squares[square] = 0
+            del self.piece_lists[piece.get_color()][square]
+            index = piece.get_board_code() + CODE_OFFSET
+            self.bitboards[index] ^= bit
+            self.occupancy[piece.get_color()] ^= bit
+            self.hash ^= piece_key(piece, position)
+            self.material -= MATERIAL[index]
+            self.advancement -= ADVANCEMENT[index][position[0]]
+        return piece
 
     def move_piece(self, piece, new_pos, should_evolve):
-        """Moves a piece to a new position, possibly evolving it.
+        """Moves a piece to a new position, possibly evolving it, and passes the turn.
         Returns: Piece (the captuwhite piece, or None if no piece was captuwhite)."""
-        prev_pos = piece.get_position()
-        captuwhite_piece = self.get_piece_at_pos(new_pos)
+        captuwhite_piece = self.remove_piece(new_pos)
+        self.remove_piece(piece.get_position())
 
         if should_evolve:
             piece.evolve()
 
-        self.grid[prev_pos[0]][prev_pos[1]] = None
         self.place_piece(piece, new_pos)
+        self.switch_turn()
 
         return captuwhite_piece
 
@@ -296,39 +1038,3 @@ class Board:
         """Checks if a position is within the board boundaries.
         Returns: bool (True if the position is valid, otherwise False)."""
         return (0 <= position[0] < 8) and (0 <= position[1] < 8)
-
-    def add_eligble_move(self, new_pos, moves, own_color):
-        """Adds a valid move for a piece if the target position is valid.
-        Returns: None if the move is invalid, True if the position is empty, False if it contains an opponent's piece.
-        """
-        if self.pos_inside_board(new_pos):
-            if self.pos_is_empty(new_pos):
-                moves.append((0, 0, new_pos))
-                return True
-
-            else:
-                piece = self.get_piece_at_pos(new_pos)
-                if piece.get_color() != own_color:
-                    moves.append((1, 0, new_pos))
-                    return False
-        return None
-
-    def add_eligble_move_mandrill(self, mandrill, new_pos, moves, own_color):
-        """Adds valid moves for a Mandrill piece, considering its ability to evolve.
-        Returns: None if the move is invalid, True if the position is empty, False if it contains an opponent's piece.
-        """
-        if self.pos_inside_board(new_pos):
-            if self.pos_is_empty(new_pos):
-                if mandrill.will_evolve(new_pos):
-                    moves.append((0, 1, new_pos))
-                moves.append((0, 0, new_pos))
-                return True
-
-            else:
-                piece = self.get_piece_at_pos(new_pos)
-                if piece.get_color() != own_color:
-                    if mandrill.will_evolve(new_pos):
-                        moves.append((1, 1, new_pos))
-                    moves.append((1, 0, new_pos))
-                    return False
-        return None
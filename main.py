@@ -1,12 +1,38 @@
+import json
+import os
+import struct
 import pygame
+from bitboard import CODE_OFFSET
+from pieces import BOARD_SQUARES, MANDRILL, PYTHON, GIRAFFE, MEERKAT, TORTOISE, CARACAL, BABOON
 from logic import Game
 from menu import GameMenu, GameState
-import time
+from search_worker import SearchWorker
+from opening_book import open_book
+from tablebase import Tablebases
+from parallel_search import RootParallelSearch, LazySMPSearch
 import colors
 
 SCREEN_SIZE = 640
 TILE_COUNT = 8
 TILE_SIZE = SCREEN_SIZE // 8
+FPS = 120  # frame rate while animating or while the AI is to move
+IDLE_TIMEOUT_MS = 1000  # longest sleep while waiting for input
+SPRITE_ROWS = 4
+SPRITE_COLUMNS = 4
+# Piece codes of the sprites in Pieces.png, row by row, White then Black of each piece.
+SPRITE_CODES = [
+    sign * code
+    for code in (GIRAFFE, TORTOISE, PYTHON, CARACAL, MEERKAT, MANDRILL, BABOON)
+    for sign in (1, -1)
+]
+# The sprite cache holds a header of magic, sprite sheet modification time, sprite
+# width and height and sprite count, then the RGBA pixels of the scaled sprites.
+SPRITE_CACHE = "pieces.cache"
+SPRITE_CACHE_MAGIC = b"SVSA"
+SPRITE_CACHE_HEADER = struct.Struct("<4sQHHH")
+# pygame before 2.1.3 names these tostring and fromstring.
+image_tobytes = getattr(pygame.image, "tobytes", None) or pygame.image.tostring
+image_frombytes = getattr(pygame.image, "frombytes", None) or pygame.image.fromstring
 
 pygame.init()
 
@@ -17,6 +43,7 @@ icon = pygame.image.load("icon.png")
 pygame.display.set_icon(icon)
 
 font = pygame.font.SysFont(None, 44)
+stats_font = pygame.font.SysFont(None, 22)
 
 
 def get_board_position(x, y):
@@ -25,10 +52,11 @@ def get_board_position(x, y):
     return (y // TILE_SIZE, x // TILE_SIZE)
 
 
-def draw_board():
-    """Draw the checker game board grid.
-    Returns: None."""
-    screen.fill(colors.WHITE)
+def render_board_background():
+    """Render the checker game board grid once, so frames can copy it.
+    Returns: pygame.Surface - the empty board."""
+    background = pygame.Surface((SCREEN_SIZE, SCREEN_SIZE)).convert()
+    background.fill(colors.WHITE)
     for row in range(TILE_COUNT):
         for col in range(TILE_COUNT):
             color = (
@@ -37,101 +65,261 @@ def draw_board():
                 else colors.TILE_COLORS["dark"]
             )
             pygame.draw.rect(
-                screen,
+                background,
                 color,
                 pygame.Rect(col * TILE_SIZE, row * TILE_SIZE, TILE_SIZE, TILE_SIZE),
             )
+    return background
 
 
-def draw_piece(piece, row, col, sprites):
-    """Render a piece at a specific board position, perfectly centered in the tile."""
-    piece_type = piece.piece_type
-    if piece.get_color() == "White":
-        piece_type = "w_" + piece_type
-    else:
-        piece_type = "b_" + piece_type
-    sprite = sprites[piece_type]
-    sprite_width, sprite_height = sprite.get_size()
+board_background = render_board_background()
+thinking_surface = font.render("Thinking...", True, colors.BLACK)
+woken_events = []  # the event wait_for_event woke up on, not handled yet
 
-    x_offset = (TILE_SIZE - sprite_width) // 2
-    y_offset = (TILE_SIZE - sprite_height) // 2
 
-    x_position = col * TILE_SIZE + x_offset
-    y_position = row * TILE_SIZE + y_offset
+def draw_board():
+    """Draw the checker game board grid.
+    Returns: None."""
+    screen.blit(board_background, (0, 0))
+
 
-    screen.blit(sprite, (x_position, y_position))
+def sprite_blit(sprites, code, row, col):
+    """Get the sprite of a piece code and where to draw it, centered in its tile.
+    Returns: Tuple[pygame.Surface, Tuple[int, int]] - a source and destination for Surface.blits."""
+    sprite, (x_offset, y_offset) = sprites[code + CODE_OFFSET]
+    return sprite, (col * TILE_SIZE + x_offset, row * TILE_SIZE + y_offset)
 
 
-def load_sprites(sprite_sheet_path):
-    """Load sprites for pieces from a sprite sheet and scale them."""
-    sprite_sheet = pygame.image.load(sprite_sheet_path).convert_alpha()
-    SPRITE_ROWS = 4
-    SPRITE_COLUMNS = 4
+def scale_sprite_sheet(sprite_sheet_path, scaled_size):
+    """Slice the piece sprites out of a sprite sheet and scale them side by side
+    into one strip, in the order of SPRITE_CODES.
+    Returns: pygame.Surface - the strip of scaled sprites."""
+    sprite_sheet = pygame.image.load(sprite_sheet_path)
     sprite_width = sprite_sheet.get_width() // SPRITE_COLUMNS
     sprite_height = sprite_sheet.get_height() // SPRITE_ROWS
+    strip = pygame.Surface(
+        (scaled_size[0] * len(SPRITE_CODES), scaled_size[1]), pygame.SRCALPHA
+    )
+    for index in range(len(SPRITE_CODES)):
+        row, col = divmod(index, SPRITE_COLUMNS)
+        sprite = sprite_sheet.subsurface(
+            (col * sprite_width, row * sprite_height, sprite_width, sprite_height)
+        )
+        strip.blit(pygame.transform.scale(sprite, scaled_size), (index * scaled_size[0], 0))
+    return strip
+
+
+def read_sprite_cache(cache_path, sprite_sheet_path, scaled_size):
+    """Read the strip of scaled sprites saved by write_sprite_cache.
+    Returns: pygame.Surface - the strip, or None if the cache is missing, was made
+    for another sprite size or is older than the sprite sheet."""
+    try:
+        with open(cache_path, "rb") as cache_file:
+            data = cache_file.read()
+        source_mtime = os.stat(sprite_sheet_path).st_mtime_ns
+    except OSError:
+        return None
+    if len(data) < SPRITE_CACHE_HEADER.size:
+        return None
+    magic, mtime, width, height, count = SPRITE_CACHE_HEADER.unpack_from(data)
+    size = (width * count, height)
+    if (
+        magic != SPRITE_CACHE_MAGIC
+        or mtime != source_mtime
+        or (width, height) != scaled_size
+        or count != len(SPRITE_CODES)
+        or len(data) != SPRITE_CACHE_HEADER.size + size[0] * size[1] * 4
+    ):
+        return None
+    return image_frombytes(data[SPRITE_CACHE_HEADER.size :], size, "RGBA")
 
-    scaled_size = (int(TILE_SIZE * 0.75), int(TILE_SIZE * 0.75))
 
-    sprites = {}
-    piece_names = [
-        "w_giraffe",
-        "b_giraffe",
-        "w_tortoise",
-        "b_tortoise",
-        "w_python",
-        "b_python",
-        "w_caracal",
-        "b_caracal",
-        "w_meerkat",
-        "b_meerkat",
-        "w_mandrill",
-        "b_mandrill",
-        "w_baboon",
-        "b_baboon",
-    ]
-    index = 0
-    for row in range(SPRITE_ROWS):
-        for col in range(SPRITE_COLUMNS):
-            if index < len(piece_names):
-                sprite = sprite_sheet.subsurface(
-                    (
-                        col * sprite_width,
-                        row * sprite_height,
-                        sprite_width,
-                        sprite_height,
-                    )
-                )
-                scaled_sprite = pygame.transform.scale(sprite, scaled_size)
-                sprites[piece_names[index]] = scaled_sprite
-                index += 1
+def write_sprite_cache(cache_path, sprite_sheet_path, strip, scaled_size):
+    """Save a strip of scaled sprites as raw pixels, so later startups can skip
+    slicing and scaling the sprite sheet. A cache that cannot be written is skipped.
+    Returns: None."""
+    header = SPRITE_CACHE_HEADER.pack(
+        SPRITE_CACHE_MAGIC,
+        os.stat(sprite_sheet_path).st_mtime_ns,
+        scaled_size[0],
+        scaled_size[1],
+        len(SPRITE_CODES),
+    )
+    try:
+        with open(cache_path, "wb") as cache_file:
+            cache_file.write(header)
+            cache_file.write(image_tobytes(strip, "RGBA"))
+    except OSError:
+        pass
+
+
+def load_sprites(sprite_sheet_path, cache_path=SPRITE_CACHE):
+    """Load the piece sprites into an atlas indexed by piece code + CODE_OFFSET, each
+    entry a sprite scaled and converted for the display with the offset that centers
+    it in a tile. The scaled sprites are cached on disk next to the sprite sheet.
+    Returns: List[Tuple[pygame.Surface, Tuple[int, int]]] - the atlas, None for codes
+    without a piece."""
+    scaled_size = (int(TILE_SIZE * 0.75), int(TILE_SIZE * 0.75))
+    strip = read_sprite_cache(cache_path, sprite_sheet_path, scaled_size)
+    if strip is None:
+        strip = scale_sprite_sheet(sprite_sheet_path, scaled_size)
+        write_sprite_cache(cache_path, sprite_sheet_path, strip, scaled_size)
+    strip = strip.convert_alpha()
+
+    offset = ((TILE_SIZE - scaled_size[0]) // 2, (TILE_SIZE - scaled_size[1]) // 2)
+    sprites = [None] * (2 * CODE_OFFSET)
+    for index, code in enumerate(SPRITE_CODES):
+        sprite = strip.subsurface((index * scaled_size[0], 0, *scaled_size)).copy()
+        sprites[code + CODE_OFFSET] = (sprite, offset)
     return sprites
 
 
 def draw_pieces(board, sprites):
-    """Draw all pieces on the board from its current state.
+    """Draw all pieces on the board from its current state in one batched blit.
     Returns: None."""
-    for row in range(8):
-        for col in range(8):
-            piece = board.get_piece_at_pos((row, col))
-            if piece:
-                draw_piece(piece, row, col, sprites)
+    squares = board.squares
+    screen.blits(
+        [
+            sprite_blit(sprites, squares[square], square >> 4, square & 7)
+            for square in BOARD_SQUARES
+            if squares[square]
+        ],
+        doreturn=False,
+    )
+
+
+def thinking_overlay():
+    """Get the indicator showing that the AI is searching for a move.
+    Returns: Tuple[pygame.Surface, Tuple[int, int]] - the text and where to draw it."""
+    text_rect = thinking_surface.get_rect(bottomright=(SCREEN_SIZE - 10, SCREEN_SIZE - 10))
+    return thinking_surface, text_rect.topleft
+
+
+def render_stats_overlay(stats):
+    """Render the statistics of an AI search for the top left corner.
+    Returns: Tuple[pygame.Surface, Tuple[int, int]] - the text and where to draw it."""
+    lines = [
+        stats_font.render(line, True, colors.BLACK, colors.WHITE)
+        for line in stats.summary_lines()
+    ]
+    width = max(line.get_width() for line in lines)
+    height = sum(line.get_height() + 2 for line in lines)
+    surface = pygame.Surface((width, height), pygame.SRCALPHA)
+    y = 0
+    for line in lines:
+        surface.blit(line, (0, y))
+        y += line.get_height() + 2
+    return surface, (6, 6)
+
+
+class BoardView:
+    """Draws the playing board, redrawing only the tiles whose piece or highlight
+    changed since the last frame and pushing just those to the display."""
+
+    def __init__(self, sprites):
+        """
+        Initialize a board view with nothing drawn yet.
+
+        Args:
+            sprites: piece sprites from load_sprites
+        """
+        self.sprites = sprites
+        self.tiles = [None] * (TILE_COUNT * TILE_COUNT)  # (piece code, highlighted) on screen
+        self.overlays = None  # (surface, position) pairs on screen
+        self.stats = None
+        self.stats_overlay = None
+
+    def invalidate(self):
+        """Forget what is on screen, so the next frame redraws the whole board.
+        Returns: None."""
+        self.overlays = None
+
+    def get_stats_overlay(self, stats):
+        """Get the rendered overlay of the search statistics, rendering it again only
+        after another search.
+        Returns: Tuple[pygame.Surface, Tuple[int, int]] - the text and where to draw it."""
+        if stats is not self.stats:
+            self.stats = stats
+            self.stats_overlay = render_stats_overlay(stats)
+        return self.stats_overlay
+
+    def draw(self, board, possible_moves, overlays):
+        """Bring the screen up to date with the board, the highlighted moves and the
+        overlays drawn on top. Does nothing if none of them changed.
+        Returns: None."""
+        highlighted = {move[2] for move in possible_moves}
+        # Surfaces compare by identity, so a re-rendered overlay counts as changed.
+        redraw_all = overlays != self.overlays
+        squares = board.squares
+        dirty_rects = []
+        background_blits = []
+        piece_blits = []
+        highlight_rects = []
+        for row in range(TILE_COUNT):
+            for col in range(TILE_COUNT):
+                tile = (squares[row * 16 + col], (row, col) in highlighted)
+                index = row * TILE_COUNT + col
+                if not redraw_all and tile == self.tiles[index]:
+                    continue
+                self.tiles[index] = tile
+                rect = pygame.Rect(col * TILE_SIZE, row * TILE_SIZE, TILE_SIZE, TILE_SIZE)
+                background_blits.append((board_background, rect, rect))
+                # A highlight covers the whole tile, so its piece is not drawn.
+                if tile[1]:
+                    highlight_rects.append(rect)
+                elif tile[0]:
+                    piece_blits.append(sprite_blit(self.sprites, tile[0], row, col))
+                dirty_rects.append(rect)
+
+        if dirty_rects:
+            screen.blits(background_blits, doreturn=False)
+            screen.blits(piece_blits, doreturn=False)
+            for rect in highlight_rects:
+                pygame.draw.rect(screen, colors.HIGHLIGHT, rect)
+            for surface, position in overlays:
+                screen.blit(surface, position)
+                dirty_rects.append(surface.get_rect(topleft=position))
+        self.overlays = overlays
+        if redraw_all:
+            pygame.display.flip()
+        elif dirty_rects:
+            pygame.display.update(dirty_rects)
 
 
-def draw_possible_moves(possible_moves):
-    """Highlight tiles for valid moves of the selected piece.
+def log_search_stats(path, game, color):
+    """Append the statistics of the last AI search to a file as one JSON line.
     Returns: None."""
-    for move in possible_moves:
-        pygame.draw.rect(
-            screen,
-            colors.HIGHLIGHT,
-            (move[2][1] * TILE_SIZE, move[2][0] * TILE_SIZE, TILE_SIZE, TILE_SIZE),
-        )
+    line = {"move": game.moves_made, "color": color}
+    line.update(game.stats.to_dict())
+    with open(path, "a") as log_file:
+        log_file.write(json.dumps(line) + "\n")
+
+
+def handle_thinking_events(search_worker, board_view):
+    """Handle events while the AI is searching, cancelling the search on quit or escape.
+    Returns: Tuple[GameState, bool] - the next game state and whether to quit."""
+    for event in get_events():
+        if event.type == pygame.VIDEOEXPOSE:
+            board_view.invalidate()
+
+        elif event.type == pygame.QUIT:
+            search_worker.cancel()
+            return GameState.MENU, True
 
+        elif event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE:
+            search_worker.cancel()
+            return GameState.MENU, False
+
+    return GameState.PLAYING, False
 
-def handle_game_events(game, selected_piece, possible_moves, menu):
+
+def handle_game_events(game, selected_piece, possible_moves, menu, board_view):
     """Handle all pygame events during gameplay and return updated selected_piece, possible_moves and game state"""
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT:
+    for event in get_events():
+        if event.type == pygame.VIDEOEXPOSE:
+            board_view.invalidate()
+
+        elif event.type == pygame.QUIT:
             return None, None, GameState.MENU, True  # quit = True
 
         elif event.type == pygame.KEYDOWN:
@@ -141,6 +329,8 @@ def handle_game_events(game, selected_piece, possible_moves, menu):
                 game.step_back()
             elif event.key == pygame.K_SPACE:
                 game.step_to_front()
+            elif event.key == pygame.K_ESCAPE:
+                return None, [], GameState.MENU, False
 
         elif event.type == pygame.MOUSEBUTTONDOWN:
             if game.viewing_mode:
@@ -163,15 +353,48 @@ def handle_game_events(game, selected_piece, possible_moves, menu):
                 piece = game.board.get_piece_at_pos(position)
                 if piece and game.is_current_player_piece(piece):
                     selected_piece = piece
-                    possible_moves = piece.get_possible_moves(position, game.board)
+                    possible_moves = game.get_legal_moves().get(position, [])
 
     return selected_piece, possible_moves, GameState.PLAYING, False
 
 
-def handle_menu_state(menu, screen, sprites):
-    menu.draw_menu(screen)
+def is_ai_turn(game, settings):
+    """Check whether the AI should be searching or playing a move.
+    Returns: bool - True if the AI is to move and the player is not looking back."""
+    return game.get_current_player().get_color() == settings["ai_color"] and not game.viewing_mode
 
-    for event in pygame.event.get():
+
+def has_pending_work(game_state, game, settings, search_worker, menu):
+    """Check whether the next frame has something to do before any input arrives:
+    an animation to step, or an AI move to search for or play.
+    Returns: bool - True if the loop should keep ticking instead of sleeping."""
+    if game_state == GameState.MENU:
+        return menu.is_animating()
+    if game_state == GameState.PLAYING:
+        return search_worker is not None or game.winner is not None or is_ai_turn(game, settings)
+    return False
+
+
+def wait_for_event():
+    """Sleep until an event arrives or IDLE_TIMEOUT_MS passes, keeping the event for
+    the next get_events call.
+    Returns: None."""
+    event = pygame.event.wait(IDLE_TIMEOUT_MS)
+    if event.type != pygame.NOEVENT:
+        woken_events.append(event)
+
+
+def get_events():
+    """Take the pending events, the one wait_for_event woke up on first, so they are
+    handled in the order they arrived.
+    Returns: List[pygame.event.Event] - the events."""
+    events = woken_events + pygame.event.get()
+    woken_events.clear()
+    return events
+
+
+def handle_menu_state(menu, screen, sprites):
+    for event in get_events():
         if event.type == pygame.QUIT:
             return None, GameState.MENU, True
 
@@ -179,69 +402,95 @@ def handle_menu_state(menu, screen, sprites):
         if action == "play":
             settings = menu.get_settings()
             game = Game(sprites)
+            game.profile_search = settings["show_stats"] or settings["stats_log"] is not None
+            if settings["ai_workers"] > 1 and settings["ai_parallel"] == "lazy":
+                game.root_search = LazySMPSearch(settings["ai_workers"] - 1)
+            elif settings["ai_workers"] > 1:
+                game.root_search = RootParallelSearch(settings["ai_workers"])
             return (game, settings), GameState.PLAYING, False
 
+    menu.draw_menu(screen)
     return None, GameState.MENU, False
 
 
 def handle_playing_state(
-    game, selected_piece, possible_moves, settings, sprites, screen, menu
+    game,
+    selected_piece,
+    possible_moves,
+    settings,
+    sprites,
+    screen,
+    menu,
+    search_worker,
+    book,
+    board_view,
 ):
-    draw_board()
-    draw_pieces(game.board, sprites)
-
-    if possible_moves:
-        draw_possible_moves(possible_moves)
+    """Draw the game, play the AI move from the opening book or run the AI search in
+    the background, and handle player input.
+    Returns: Tuple - updated selected_piece, possible_moves, game state, quit flag and search worker."""
+    overlays = []
+    if settings["show_stats"]:
+        overlays.append(board_view.get_stats_overlay(game.stats))
 
     if game.winner:
-        return selected_piece, possible_moves, GameState.GAME_OVER, False
-
-    if (
-        game.get_current_player().get_color() == settings["ai_color"]
-        and not game.viewing_mode
-    ):
-        pygame.display.flip()
+        return selected_piece, possible_moves, GameState.GAME_OVER, False, None
+
+    if is_ai_turn(game, settings):
+        if search_worker is None:
+            game.step_to_front()
+            # Generate the moves once; the book and the search snapshot both use them.
+            game.get_legal_moves()
+            book_move = book.choose_move(game) if book else None
+            if book_move:
+                game.make_move(*book_move)
+                board_view.draw(game.board, possible_moves, overlays)
+                return selected_piece, possible_moves, GameState.PLAYING, False, None
+
+            maximizing_player = game.get_current_player().get_color() == "Black"
+            search_worker = SearchWorker(
+                game, settings["ai_depth"], settings["ai_time_ms"], maximizing_player
+            )
+            search_worker.start()
+
+        elif search_worker.is_done():
+            best_move = search_worker.get_best_move(game)
+            game.stats = search_worker.snapshot.stats
+            if settings["stats_log"] is not None:
+                log_search_stats(settings["stats_log"], game, settings["ai_color"])
+            if best_move:
+                piece_to_move, move = best_move
+                game.make_move(piece_to_move, move)
+                if settings["show_stats"]:
+                    overlays = [board_view.get_stats_overlay(game.stats)]
+                board_view.draw(game.board, possible_moves, overlays)
+                return selected_piece, possible_moves, GameState.PLAYING, False, None
+            else:
+                return selected_piece, possible_moves, GameState.GAME_OVER, False, None
 
-        game.step_to_front()
-        start_time = time.time()
-        if game.get_current_player().get_color() == "Black":
-            maximizing_player = True
-        else:
-            maximizing_player = False
+        overlays.append(thinking_overlay())
+        board_view.draw(game.board, possible_moves, overlays)
 
-        best_score, best_move = game.minimax(
-            settings["ai_depth"], -float("inf"), float("inf"), maximizing_player
-        )
-        end_time = time.time()
-        elapsed_time = end_time - start_time
-
-        if best_move:
-            piece_to_move, move = best_move
-            game.make_move(piece_to_move, move)
-        else:
-            return selected_piece, possible_moves, GameState.GAME_OVER, False
+        game_state, should_quit = handle_thinking_events(search_worker, board_view)
+        if game_state != GameState.PLAYING or should_quit:
+            return selected_piece, possible_moves, game_state, should_quit, None
     else:
         selected_piece, possible_moves, game_state, should_quit = handle_game_events(
-            game, selected_piece, possible_moves, menu
+            game, selected_piece, possible_moves, menu, board_view
         )
         if should_quit:
-            return selected_piece, possible_moves, game_state, True
+            return selected_piece, possible_moves, game_state, True, search_worker
 
         if game_state != GameState.PLAYING:
-            return selected_piece, possible_moves, game_state, False
+            return selected_piece, possible_moves, game_state, False, search_worker
 
-        pygame.display.flip()
+        board_view.draw(game.board, possible_moves, overlays)
 
-    return selected_piece, possible_moves, GameState.PLAYING, False
+    return selected_piece, possible_moves, GameState.PLAYING, False, search_worker
 
 
 def handle_game_over_state(game, menu, sprites, screen):
     """Handle the game over state with proper event handling."""
-    draw_board()
-    draw_pieces(game.board, sprites)
-    menu.draw_game_over(screen, game.winner)
-
-    for event in pygame.event.get():
+    for event in get_events():
         if event.type == pygame.QUIT:
             return GameState.GAME_OVER, True
 
@@ -250,32 +499,44 @@ def handle_game_over_state(game, menu, sprites, screen):
         if action == "menu":
             return GameState.MENU, False
 
+    draw_board()
+    draw_pieces(game.board, sprites)
+    menu.draw_game_over(screen, game.winner)
     return GameState.GAME_OVER, False
 
 
 def main():
-    sprites = load_sprites("pieces.png")
+    sprites = load_sprites("Pieces.png")
     menu = GameMenu(SCREEN_SIZE)
+    book = open_book(menu.OPENING_BOOK)
+    tablebases = Tablebases(menu.TABLEBASES)
+    board_view = BoardView(sprites)
     game_state = GameState.MENU
 
     game = None
     selected_piece = None
     possible_moves = []
     settings = None
+    search_worker = None
 
     running = True
+    previous_state = None
     while running:
         if game_state == GameState.MENU:
             result, game_state, should_quit = handle_menu_state(menu, screen, sprites)
             if should_quit:
                 running = False
             elif result:
+                if game and game.root_search:
+                    game.root_search.shutdown()
                 game, settings = result
+                game.tablebases = tablebases
+                board_view.invalidate()
                 selected_piece = None
                 possible_moves = []
 
         elif game_state == GameState.PLAYING:
-            selected_piece, possible_moves, game_state, should_quit = (
+            selected_piece, possible_moves, game_state, should_quit, search_worker = (
                 handle_playing_state(
                     game,
                     selected_piece,
@@ -284,6 +545,9 @@ def main():
                     sprites,
                     screen,
                     menu,
+                    search_worker,
+                    book,
+                    board_view,
                 )
             )
             if should_quit:
@@ -299,8 +563,24 @@ def main():
         if game_state != GameState.PLAYING:
             pygame.display.flip()
 
-        clock.tick(120)
-
+        # Sleep until input arrives unless something is moving, the AI has work to
+        # do, or the state just changed and its first frame is still to be drawn.
+        if (
+            game_state != previous_state
+            or has_pending_work(game_state, game, settings, search_worker, menu)
+        ):
+            clock.tick(FPS)
+        elif running:
+            wait_for_event()
+        previous_state = game_state
+
+    if search_worker:
+        search_worker.cancel()
+    if game and game.root_search:
+        game.root_search.shutdown()
+    if book:
+        book.close()
+    tablebases.close()
     pygame.quit()
 
 
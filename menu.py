@@ -10,6 +10,89 @@ class GameState:
     GAME_OVER = 2
 
 
+class SurfaceCache:
+    """Rendered text, rounded rectangle and filled surfaces shared by the menu widgets.
+
+    Keys hold everything a surface is rendered from, so a widget whose text, color
+    or size changes just asks for another key. The oldest entries are dropped once
+    the cache is full, which keeps animations that step through colors bounded.
+    """
+
+    def __init__(self, limit=256):
+        """
+        Initialize an empty cache.
+
+        Args:
+            limit: most surfaces kept at a time
+        """
+        self.limit = limit
+        self.surfaces = {}
+
+    def _get(self, key, render):
+        surface = self.surfaces.get(key)
+        if surface is None:
+            if len(self.surfaces) >= self.limit:
+                del self.surfaces[next(iter(self.surfaces))]
+            surface = self.surfaces[key] = render()
+        return surface
+
+    def text(self, text, font, color):
+        """
+        Get a line of text rendered with a font.
+
+        Args:
+            text: the text
+            font: pygame Font to render it with
+            color: RGB color tuple
+
+        Returns:
+            pygame.Surface: the rendered text
+        """
+        return self._get(("text", text, font, color), lambda: font.render(text, True, color))
+
+    def rounded_rect(self, size, color, radius):
+        """
+        Get a filled rectangle with rounded corners on a transparent surface.
+
+        Args:
+            size: (width, height) of the rectangle
+            color: RGB or RGBA color tuple
+            radius: corner radius in pixels, 0 for square corners
+
+        Returns:
+            pygame.Surface: the rendered rectangle
+        """
+
+        def render():
+            surface = pygame.Surface(size, pygame.SRCALPHA)
+            pygame.draw.rect(surface, color, (0, 0, *size), border_radius=radius)
+            return surface
+
+        return self._get(("rect", size, color, radius), render)
+
+    def filled(self, size, color):
+        """
+        Get a surface filled with one color, its alpha kept per pixel.
+
+        Args:
+            size: (width, height) of the surface
+            color: RGB or RGBA color tuple
+
+        Returns:
+            pygame.Surface: the filled surface
+        """
+
+        def render():
+            surface = pygame.Surface(size, pygame.SRCALPHA)
+            surface.fill(color)
+            return surface
+
+        return self._get(("filled", size, color), render)
+
+
+surface_cache = SurfaceCache()
+
+
 def draw_rounded_rect(surface, color, rect, radius):
     """
     Draw a rounded rectangle on a surface.
@@ -24,10 +107,7 @@ def draw_rounded_rect(surface, color, rect, radius):
         pygame.draw.rect(surface, color, rect)
         return
 
-    rounded_surf = pygame.Surface((rect.width, rect.height), pygame.SRCALPHA)
-    pygame.draw.rect(
-        rounded_surf, color, (0, 0, rect.width, rect.height), border_radius=radius
-    )
+    rounded_surf = surface_cache.rounded_rect((rect.width, rect.height), color, radius)
     surface.blit(rounded_surf, rect.topleft)
 
 
@@ -74,7 +154,7 @@ class Button:
 
         draw_rounded_rect(screen, color, self.rect, 8)
 
-        text_surface = self.font.render(self.text, True, self.text_color)
+        text_surface = surface_cache.text(self.text, self.font, self.text_color)
         text_rect = text_surface.get_rect(center=self.rect.center)
         screen.blit(text_surface, text_rect)
 
@@ -147,7 +227,7 @@ class Slider:
         Args:
             screen: Pygame surface to draw on
         """
-        text = self.font.render(f"{self.label}: {self.val}", True, colors.BLACK)
+        text = surface_cache.text(f"{self.label}: {self.val}", self.font, colors.BLACK)
         screen.blit(text, (self.x + 60, self.y))
 
         track_rect = pygame.Rect(
@@ -257,21 +337,29 @@ class Toggle:
         Args:
             dt: Delta time for smooth animation
         """
-        if abs(self.animation_progress - self.target_progress) > 0.01:
+        if self.is_animating():
             self.animation_progress += (
                 (self.target_progress - self.animation_progress)
                 * self.ANIMATION_SPEED
                 * dt
             )
 
+    def is_animating(self):
+        """Check whether the switch is still sliding to its new state.
+
+        Returns:
+            bool: True while update_animation has steps left
+        """
+        return abs(self.animation_progress - self.target_progress) > 0.01
+
     def draw(self, screen):
         """Draw the toggle on the given screen surface.
 
         Args:
             screen: Pygame surface to draw on
         """
-        option1_text = self.option_font.render(self.option1, True, colors.BLACK)
-        option2_text = self.option_font.render(self.option2, True, colors.BLACK)
+        option1_text = surface_cache.text(self.option1, self.option_font, colors.BLACK)
+        option2_text = surface_cache.text(self.option2, self.option_font, colors.BLACK)
 
         option1_rect = option1_text.get_rect(
             centery=self.switch_rect.centery,
@@ -348,6 +436,14 @@ class Toggle:
 class GameMenu:
     """Main game menu with settings and navigation."""
 
+    AI_TIME_MS = 3000
+    AI_WORKERS = 1  # above 1 the search is spread over several processes
+    AI_PARALLEL = "root"  # "root" splits the root moves, "lazy" shares a table (Lazy SMP)
+    SHOW_STATS = False  # draw the statistics of the last AI search over the board
+    OPENING_BOOK = "opening_book.bin"  # played from instead of searching while it has moves
+    TABLEBASES = "tablebases"  # directory of endgame tables written by tablebase.py
+    STATS_LOG = None  # path of a file the AI search statistics are appended to, one JSON line per move
+
     def __init__(self, screen_size):
         """
         Initialize the game menu.
@@ -372,7 +468,7 @@ class GameMenu:
         """Render the main menu screen."""
         screen.fill(colors.BACKGROUND)
 
-        title_text = self.title_font.render("SAVANNA STRATEGY", True, colors.BLACK)
+        title_text = surface_cache.text("SAVANNA STRATEGY", self.title_font, colors.BLACK)
         title_rect = title_text.get_rect(center=(self.screen_size // 2, 80))
 
         screen.blit(title_text, title_rect)
@@ -389,8 +485,7 @@ class GameMenu:
             screen: pygame surface to draw on
             winner: the winning player as string
         """
-        overlay = pygame.Surface((self.screen_size, self.screen_size), pygame.SRCALPHA)
-        overlay.fill(colors.OVERLAY)
+        overlay = surface_cache.filled((self.screen_size, self.screen_size), colors.OVERLAY)
         screen.blit(overlay, (0, 0))
 
         center_x = self.screen_size // 2
@@ -402,12 +497,21 @@ class GameMenu:
         else:
             winner_text = "Draw!"
 
-        text_surface = self.title_font.render(winner_text, True, text_color)
+        text_surface = surface_cache.text(winner_text, self.title_font, text_color)
         text_rect = text_surface.get_rect(center=(center_x, center_y - 50))
         screen.blit(text_surface, text_rect)
 
         self.menu_button.draw(screen)
 
+    def is_animating(self):
+        """
+        Check whether any menu widget is animating.
+
+        Returns:
+            bool: True if the menu has to be redrawn without waiting for input
+        """
+        return self.color_toggle.is_animating()
+
     def handle_menu_events(self, event):
         """
         Handle menu events and return actions.
@@ -453,4 +557,9 @@ class GameMenu:
             "player_color": player_color,
             "ai_color": ai_color,
             "ai_depth": self.depth_slider.val,
+            "ai_time_ms": self.AI_TIME_MS,
+            "ai_workers": self.AI_WORKERS,
+            "ai_parallel": self.AI_PARALLEL,
+            "show_stats": self.SHOW_STATS,
+            "stats_log": self.STATS_LOG,
         }
@@ -0,0 +1,172 @@
+import mmap
+import os
+import random
+import struct
+import sys
+from logic import Game
+from transposition import MOVES
+
+# File layout: a header of magic and entry count, then entries sorted by position
+# hash, the moves of one position by falling weight.
+MAGIC = b"SVBK"
+HEADER = struct.Struct("<4sI")
+ENTRY = struct.Struct("<QHH")  # position hash, packed move, weight
+BOOK_PLIES = 12  # moves deeper into a game than this are not put in the book
+MAX_WEIGHT = 0xFFFF
+# Weight a move earns for the side that played it, by the result of the game.
+RESULT_WEIGHTS = {"win": 2, "draw": 1, "loss": 0}
+
+
+def pack_move(stored_move) -> int:
+    """Packs a (from_position, (capture, evolve, to_position)) move into 14 bits.
+    Returns: int (from square, to square, capture and evolve bits)."""
+    (from_row, from_col), (capture, evolve, (to_row, to_col)) = stored_move
+    return (from_row * 8 + from_col) | (to_row * 8 + to_col) << 6 | capture << 12 | evolve << 13
+
+
+def unpack_move(packed: int):
+    """Unpacks a move packed by pack_move.
+    Returns: Tuple[Position, Move] (the from position and the move triple)."""
+    from_square = packed & 63
+    to_square = packed >> 6 & 63
+    move = MOVES[packed >> 12 & 1][packed >> 13 & 1][(to_square >> 3) * 16 + (to_square & 7)]
+    return (from_square >> 3, from_square & 7), move
+
+
+def build_book(games, max_plies=BOOK_PLIES):
+    """Collects the moves played in recorded games by the position they were played in.
+    Each game is its (from, to, evolve) moves from the start position, the winner,
+    "White", "Black" or None for a draw, and the number of opening plies it started
+    with. Opening plies were not chosen by the engine, so they are played but not
+    put in the book. A move earns the weight in RESULT_WEIGHTS for the result of
+    the side that played it.
+    Returns: Dict[int, Dict[Tuple[Position, Move], int]] (move weights by position hash)."""
+    book = {}
+    for moves, winner, opening_plies in games:
+        game = Game(None)
+        for ply, (from_pos, to_pos, evolve) in enumerate(moves[:max_plies]):
+            color = game.get_current_player().get_color()
+            if winner is None:
+                weight = RESULT_WEIGHTS["draw"]
+            else:
+                weight = RESULT_WEIGHTS["win" if winner == color else "loss"]
+            capture = 0 if game.board.get_piece_at_pos(to_pos) is None else 1
+            move = (capture, evolve, to_pos)
+            if weight and ply >= opening_plies:
+                position_moves = book.setdefault(game.board.hash, {})
+                stored_move = (from_pos, move)
+                position_moves[stored_move] = position_moves.get(stored_move, 0) + weight
+            if game.make_move(game.board.get_piece_at_pos(from_pos), move):
+                break
+    return book
+
+
+def write_book(path, book):
+    """Writes a book built by build_book to a file in the layout read by OpeningBook.
+    Returns: None."""
+    entries = [
+        (key, pack_move(stored_move), min(weight, MAX_WEIGHT))
+        for key, position_moves in book.items()
+        for stored_move, weight in position_moves.items()
+    ]
+    entries.sort(key=lambda entry: (entry[0], -entry[2], entry[1]))
+    with open(path, "wb") as book_file:
+        book_file.write(HEADER.pack(MAGIC, len(entries)))
+        for entry in entries:
+            book_file.write(ENTRY.pack(*entry))
+
+
+class OpeningBook:
+    """Opening book file, memory-mapped and searched by position hash.
+
+    Lookups binary search the sorted entries in place, so opening a book costs
+    nothing however large it is.
+    """
+
+    def __init__(self, path):
+        """
+        Open a book file written by write_book.
+
+        Args:
+            path: the book file
+        """
+        self.file = open(path, "rb")
+        size = os.fstat(self.file.fileno()).st_size
+        if size < HEADER.size:
+            self.file.close()
+            raise ValueError(f"{path} is not an opening book.")
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC or size != HEADER.size + self.count * ENTRY.size:
+            self.close()
+            raise ValueError(f"{path} is not an opening book.")
+
+    def close(self):
+        """Unmaps and closes the book file.
+        Returns: None."""
+        self.data.close()
+        self.file.close()
+
+    def _key_at(self, index):
+        return ENTRY.unpack_from(self.data, HEADER.size + index * ENTRY.size)[0]
+
+    def probe(self, key):
+        """Looks up the moves stored for a position.
+        Returns: List[Tuple[int, Tuple[Position, Move]]] (weight and move for each
+        stored move, heaviest first, or an empty list if the position is not in the book)."""
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self._key_at(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        moves = []
+        for index in range(low, self.count):
+            entry_key, packed, weight = ENTRY.unpack_from(
+                self.data, HEADER.size + index * ENTRY.size
+            )
+            if entry_key != key:
+                break
+            moves.append((weight, unpack_move(packed)))
+        return moves
+
+    def choose_move(self, game, rng=random):
+        """Picks a book move for the side to move, at random by weight. Stored moves
+        that are not legal in the position, after a hash collision, are skipped.
+        Returns: Tuple[Piece, Move] (the piece and its move, or None if the book has
+        no move for the position)."""
+        legal_moves = game.get_legal_moves()
+        candidates = []
+        for weight, (from_pos, move) in self.probe(game.board.hash):
+            if move in legal_moves.get(from_pos, ()):
+                candidates.append((weight, (game.board.get_piece_at_pos(from_pos), move)))
+        if not candidates:
+            return None
+        weights = [weight for weight, _ in candidates]
+        return rng.choices([piece_move for _, piece_move in candidates], weights)[0]
+
+
+def open_book(path):
+    """Opens an opening book if the file exists.
+    Returns: OpeningBook (the book, or None if there is no file at the path)."""
+    if not os.path.exists(path):
+        return None
+    return OpeningBook(path)
+
+
+if __name__ == "__main__":
+    from search_stats import SETTINGS
+    from tournament import random_openings, play_pairings
+
+    opening_count = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    path = sys.argv[3] if len(sys.argv) > 3 else "opening_book.bin"
+    config = dict(SETTINGS["all"], depth=4, time_ms=2000)
+    results = play_pairings(config, config, random_openings(opening_count, 2), workers)
+    book = build_book(
+        (result["moves"], result["winner"], result["opening_plies"]) for _, result in results
+    )
+    write_book(path, book)
+    move_count = sum(len(position_moves) for position_moves in book.values())
+    print(f"{move_count} moves in {len(book)} positions written to {path}")
@@ -0,0 +1,355 @@
+import math
+import multiprocessing
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from logic import Game, Board
+from tablebase import Tablebases
+from transposition import EXACT, SharedTranspositionTable
+
+POLL_INTERVAL = 0.05  # seconds between checks for a stop request
+# Game attributes copied to the games of worker and helper processes.
+SEARCH_SWITCHES = ("use_pvs", "use_null_move", "use_lmr", "use_quiescence")
+
+_shared_bound = None
+_worker_game = None
+_worker_search_id = None
+
+
+def _init_worker(shared_bound):
+    global _shared_bound, _worker_game, _worker_search_id
+    _shared_bound = shared_bound
+    _worker_game = Game(None)
+    _worker_search_id = None
+
+
+def search_settings(game):
+    """Collects what another process needs to search like a game: its search switches
+    and the directory of its tablebases.
+    Returns: Tuple[Dict[str, bool], str] (the switches by name, and the tablebase
+    directory or None)."""
+    switches = {switch: getattr(game, switch) for switch in SEARCH_SWITCHES}
+    directory = game.tablebases.directory if game.tablebases is not None else None
+    return switches, directory
+
+
+def apply_settings(game, settings):
+    """Sets the switches collected by search_settings on a game, opening the tablebases
+    again only when their directory changed.
+    Returns: None."""
+    switches, directory = settings
+    for switch, value in switches.items():
+        setattr(game, switch, value)
+    current = game.tablebases.directory if game.tablebases is not None else None
+    if directory != current:
+        if game.tablebases is not None:
+            game.tablebases.close()
+        game.tablebases = Tablebases(directory) if directory is not None else None
+
+
+def _search_move(
+    search_id, packed_board, from_pos, move, depth, maximizing_player, seconds_left, settings
+):
+    """Searches one root move in a worker process, using the best bound found so far.
+    The first move of a new root search starts a new generation of the worker's table
+    and forgets the killer moves and history scores of the last one.
+    Returns: Tuple[float, float, bool, int] (score, bound it was searched with, whether
+    the search ran out of time, nodes searched)."""
+    global _worker_search_id
+    game = _worker_game
+    if search_id != _worker_search_id:
+        _worker_search_id = search_id
+        game.tt.new_search()
+        game.clear_move_ordering()
+    apply_settings(game, settings)
+    game.load_board(Board.from_bytes(packed_board))
+    game.nodes = 0
+    game.search_aborted = False
+    game.search_deadline = (
+        None if seconds_left is None else time.perf_counter() + seconds_left
+    )
+    bound = _shared_bound.value
+
+    piece = game.board.get_piece_at_pos(from_pos)
+    old_pos = piece.get_position()
+    captuwhite_piece = game.apply_move(piece, move[2], move[1])
+    if maximizing_player:
+        score, _ = game.minimax(depth - 1, bound, math.inf, False, 1)
+    else:
+        score, _ = game.minimax(depth - 1, -math.inf, bound, True, 1)
+    game.undo_move(piece, old_pos, captuwhite_piece, move[1])
+    return score, bound, game.search_aborted, game.nodes
+
+
+class RootParallelSearch:
+    """Splits the root moves of a search over a pool of worker processes.
+
+    The first move is searched in the calling process (Young Brothers Wait), the
+    rest go to the workers. Workers start each move from the best bound found so
+    far, which is kept in shared memory and tightened as results come in. The
+    chosen move is the same one the serial Game.minimax returns at equal depth.
+    """
+
+    def __init__(self, workers):
+        """
+        Initialize the worker pool.
+
+        Args:
+            workers: number of worker processes
+        """
+        self.workers = workers
+        self.searches = 0  # numbers the root searches, so workers know when one starts
+        self.root_table, self.root_generation = None, None
+        self.shared_bound = multiprocessing.Value("d", 0.0)
+        self.executor = ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(self.shared_bound,),
+        )
+
+    def shutdown(self):
+        """Stop the worker processes."""
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def _improves(self, score, best_score, maximizing_player):
+        return score > best_score if maximizing_player else score < best_score
+
+    def _update_bound(self, score, maximizing_player):
+        with self.shared_bound.get_lock():
+            if self._improves(score, self.shared_bound.value, maximizing_player):
+                self.shared_bound.value = score
+
+    def search(self, game, depth, maximizing_player):
+        """
+        Search the current position of a game to a fixed depth.
+
+        Args:
+            game: the Game to search, its time limit and stop requests are honoured
+            depth: search depth
+            maximizing_player: True if the side to move is Black
+
+        Returns:
+            tuple: (score, (piece, move)) like Game.minimax
+        """
+        if game.tt is not self.root_table or game.tt.generation != self.root_generation:
+            # The iterations of one root search share a generation of the game's table.
+            self.root_table, self.root_generation = game.tt, game.tt.generation
+            self.searches += 1
+        key = game.board.hash
+        entry = game.tt.probe(key)
+        moves = game.order_moves(game.get_root_moves(), key, entry[4] if entry else None)
+        worst = -math.inf if maximizing_player else math.inf
+        if not moves:
+            return worst, None
+
+        # Young Brothers Wait: the eldest move is searched serially to get a bound.
+        piece, move = moves[0]
+        old_pos = piece.get_position()
+        captuwhite_piece = game.apply_move(piece, move[2], move[1])
+        best_score, _ = game.minimax(depth - 1, -math.inf, math.inf, not maximizing_player, 1)
+        game.undo_move(piece, old_pos, captuwhite_piece, move[1])
+        if game.search_aborted:
+            return 0, None
+        best_index = 0
+        self.shared_bound.value = best_score
+
+        packed_board = game.board.to_bytes()
+        settings = search_settings(game)
+        seconds_left = None
+        if game.search_deadline is not None:
+            seconds_left = game.search_deadline - time.perf_counter()
+        futures = {
+            self.executor.submit(
+                _search_move,
+                self.searches,
+                packed_board,
+                piece.get_position(),
+                move,
+                depth,
+                maximizing_player,
+                seconds_left,
+                settings,
+            ): index
+            for index, (piece, move) in enumerate(moves[1:], start=1)
+        }
+
+        results = {}
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, timeout=POLL_INTERVAL, return_when=FIRST_COMPLETED)
+            for future in done:
+                score, bound, aborted, nodes = future.result()
+                game.nodes += nodes
+                if aborted:
+                    game.search_aborted = True
+                results[futures[future]] = (score, bound)
+                if self._improves(score, bound, maximizing_player):
+                    self._update_bound(score, maximizing_player)
+            if game.search_aborted:
+                for future in pending:
+                    future.cancel()
+                return 0, None
+
+        for index in sorted(results):
+            score, bound = results[index]
+            if self._improves(score, bound, maximizing_player) and self._improves(
+                score, best_score, maximizing_player
+            ):
+                best_score, best_index = score, index
+
+        # A move that failed low against a bound equal to the best score may tie it.
+        # The serial search prefers the earlier of two equal moves, so check those exactly.
+        for index in sorted(results):
+            score, bound = results[index]
+            if index < best_index and score == best_score:
+                piece, move = moves[index]
+                old_pos = piece.get_position()
+                captuwhite_piece = game.apply_move(piece, move[2], move[1])
+                score, _ = game.minimax(
+                    depth - 1, -math.inf, math.inf, not maximizing_player, 1
+                )
+                game.undo_move(piece, old_pos, captuwhite_piece, move[1])
+                if game.search_aborted:
+                    return 0, None
+                if score == best_score:
+                    best_index = index
+                    break
+
+        piece, move = moves[best_index]
+        game.tt.store(key, depth, best_score, EXACT, (piece.get_position(), move))
+        return best_score, moves[best_index]
+
+
+class _HelperGame(Game):
+    """Game searched by a Lazy SMP helper. Odd helpers search one ply deeper and
+    every helper rotates the moves after the first by its index, so the helpers
+    spread over different parts of the tree instead of repeating the main search."""
+
+    def __init__(self, index):
+        super().__init__(None)
+        self.index = index
+
+    def order_moves(self, moves, key, tt_move, ply=0):
+        moves = super().order_moves(moves, key, tt_move, ply)
+        if len(moves) > 2:
+            shift = self.index % (len(moves) - 1)
+            moves[1:] = moves[1 + shift :] + moves[1 : 1 + shift]
+        return moves
+
+
+def _run_helper(table_size, table_name, index, jobs, done, stop):
+    """Lazy SMP helper process: searches every position it is sent with the shared
+    table until the main search sets the stop event."""
+    game = _HelperGame(index)
+    game.tt = SharedTranspositionTable(table_size, table_name)
+    while True:
+        job = jobs.get()
+        if job is None:
+            break
+        search_id, packed_board, depth, maximizing_player, settings = job
+        apply_settings(game, settings)
+        game.load_board(Board.from_bytes(packed_board))
+        game.nodes = 0
+        game.search_aborted = False
+        game.stop_requested = False
+        watcher = threading.Thread(target=lambda: (stop.wait(), game.stop_search()))
+        watcher.start()
+        game.minimax(depth + index % 2, -math.inf, math.inf, maximizing_player)
+        watcher.join()
+        done.put((search_id, game.nodes))
+    if game.tablebases is not None:
+        game.tablebases.close()
+    game.tt.close()
+
+
+class LazySMPSearch:
+    """Searches each iteration in several processes that share one transposition table.
+
+    Every helper process searches the same position as the calling process, which
+    then finds many results already in the shared table. Only the calling
+    process's result is used; the helpers stop once it is done. The game's
+    transposition table is replaced by the shared one on the first search, which
+    also starts a new generation of the shared table. The nodes the helpers search
+    are counted in the game's stats.helper_nodes, apart from the game's own nodes.
+    """
+
+    def __init__(self, helpers, table_size=1 << 18):
+        """
+        Initialize the shared table and start the helper processes.
+
+        Args:
+            helpers: number of helper processes
+            table_size: number of transposition table entries, a power of two
+        """
+        self.table = SharedTranspositionTable(table_size)
+        self.jobs = multiprocessing.Queue()
+        self.done = multiprocessing.Queue()
+        self.stop = multiprocessing.Event()
+        self.searches = 0  # numbers the jobs, so late reports of earlier searches are ignored
+        self.processes = [
+            multiprocessing.Process(
+                target=_run_helper,
+                args=(table_size, self.table.shm.name, index, self.jobs, self.done, self.stop),
+                daemon=True,
+            )
+            for index in range(helpers)
+        ]
+        for process in self.processes:
+            process.start()
+
+    def shutdown(self):
+        """Stop the helper processes and free the shared table."""
+        for _ in self.processes:
+            self.jobs.put(None)
+        for process in self.processes:
+            process.join(timeout=1)
+            if process.is_alive():
+                process.terminate()
+        self.table.close()
+        self.table.unlink()
+
+    def search(self, game, depth, maximizing_player):
+        """
+        Search the current position of a game to a fixed depth.
+
+        Args:
+            game: the Game to search, its time limit and stop requests are honoured
+            depth: search depth
+            maximizing_player: True if the side to move is Black
+
+        Returns:
+            tuple: (score, (piece, move)) like Game.minimax
+        """
+        if game.tt is not self.table:
+            # A fresh copy of the game starts a new root search on the shared table.
+            game.tt = self.table
+            self.table.new_search()
+        self.stop.clear()
+        self.searches += 1
+        packed_board = game.board.to_bytes()
+        settings = search_settings(game)
+        for _ in self.processes:
+            self.jobs.put((self.searches, packed_board, depth, maximizing_player, settings))
+        try:
+            return game.minimax(depth, -math.inf, math.inf, maximizing_player)
+        finally:
+            self.stop.set()
+            game.stats.helper_nodes += self._collect_helper_nodes(self.searches)
+
+    def _collect_helper_nodes(self, search_id):
+        """Waits for every helper to report the nodes it searched, giving up once a
+        helper has died so the search cannot hang on a report that never comes.
+        Returns: int (the nodes the helpers reported for the search)."""
+        nodes, reports = 0, 0
+        while reports < len(self.processes):
+            try:
+                reported_id, helper_nodes = self.done.get(timeout=POLL_INTERVAL)
+            except queue.Empty:
+                if not all(process.is_alive() for process in self.processes):
+                    break
+                continue
+            if reported_id == search_id:
+                nodes += helper_nodes
+                reports += 1
+        return nodes
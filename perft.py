@@ -0,0 +1,183 @@
+import sys
+import time
+from logic import Game
+from pieces import Tortoise
+
+# Reference positions, given as (from, to, evolve) moves played from Board.setup.
+REFERENCE_POSITIONS = {
+    "start": [],
+    "opening": [
+        ((1, 0), (3, 0), 0),
+        ((6, 0), (4, 0), 0),
+        ((1, 2), (3, 2), 0),
+        ((6, 2), (4, 2), 0),
+        ((1, 4), (3, 4), 0),
+        ((6, 4), (4, 4), 0),
+        ((1, 7), (3, 7), 0),
+        ((6, 7), (4, 7), 0),
+    ],
+    "middlegame": [
+        ((1, 0), (3, 0), 0),
+        ((6, 6), (5, 5), 0),
+        ((1, 1), (3, 1), 0),
+        ((7, 7), (4, 7), 0),
+        ((1, 7), (2, 6), 0),
+        ((6, 3), (4, 3), 0),
+        ((1, 3), (3, 3), 0),
+        ((4, 3), (3, 2), 0),
+        ((1, 4), (3, 4), 0),
+        ((3, 2), (2, 2), 0),
+        ((1, 5), (3, 5), 0),
+        ((4, 7), (3, 7), 0),
+        ((0, 2), (1, 3), 0),
+        ((2, 2), (1, 3), 0),
+        ((0, 3), (1, 3), 0),
+        ((3, 7), (0, 7), 0),
+    ],
+    "baboons": [
+        ((1, 5), (2, 6), 0),
+        ((6, 1), (5, 1), 0),
+        ((1, 4), (3, 4), 0),
+        ((6, 2), (5, 2), 0),
+        ((0, 7), (2, 7), 0),
+        ((7, 0), (4, 0), 0),
+        ((2, 7), (2, 5), 0),
+        ((7, 1), (6, 2), 0),
+        ((1, 0), (3, 0), 0),
+        ((6, 7), (4, 7), 0),
+        ((2, 5), (2, 7), 0),
+        ((7, 7), (6, 7), 0),
+        ((0, 5), (1, 5), 0),
+        ((4, 7), (3, 6), 0),
+        ((3, 4), (4, 5), 0),
+        ((3, 6), (2, 7), 0),
+        ((1, 2), (2, 1), 0),
+        ((2, 7), (1, 6), 0),
+        ((4, 5), (5, 4), 0),
+        ((1, 6), (0, 5), 1),
+        ((1, 7), (3, 7), 0),
+        ((4, 0), (3, 0), 0),
+        ((5, 4), (6, 3), 0),
+        ((3, 0), (0, 0), 0),
+        ((6, 3), (7, 2), 1),
+        ((6, 0), (5, 0), 0),
+    ],
+    "evolution": [
+        ((1, 4), (2, 5), 0),
+        ((6, 7), (5, 7), 0),
+        ((2, 5), (3, 6), 0),
+        ((5, 7), (4, 6), 0),
+        ((1, 5), (3, 5), 0),
+        ((6, 1), (5, 1), 0),
+        ((3, 5), (4, 4), 0),
+        ((6, 5), (4, 5), 0),
+        ((1, 7), (2, 7), 0),
+        ((4, 5), (3, 4), 0),
+        ((1, 6), (2, 5), 0),
+        ((3, 4), (2, 5), 0),
+        ((0, 6), (3, 7), 0),
+        ((6, 4), (5, 4), 0),
+        ((1, 0), (2, 0), 0),
+        ((7, 5), (4, 2), 0),
+        ((2, 0), (3, 1), 0),
+        ((7, 2), (5, 0), 0),
+        ((3, 6), (4, 5), 0),
+        ((7, 6), (6, 7), 0),
+        ((0, 1), (3, 0), 0),
+        ((6, 6), (5, 5), 0),
+        ((1, 3), (3, 3), 0),
+        ((7, 4), (6, 5), 0),
+        ((3, 1), (4, 0), 0),
+        ((6, 3), (4, 3), 0),
+        ((4, 5), (5, 6), 0),
+        ((6, 2), (5, 3), 0),
+        ((3, 7), (1, 7), 0),
+        ((4, 6), (3, 5), 0),
+        ((1, 2), (2, 1), 0),
+        ((5, 0), (4, 1), 0),
+        ((2, 1), (3, 1), 0),
+        ((5, 4), (4, 5), 0),
+        ((5, 6), (6, 6), 0),
+        ((7, 3), (7, 4), 0),
+    ],
+}
+
+# (leaf count, captures, evolutions) for depth 1, 2, 3, ... of each reference position.
+REFERENCE_COUNTS = {
+    "start": [(34, 0, 0), (1156, 0, 0), (40410, 122, 0), (1401914, 7146, 0)],
+    "opening": [(38, 0, 0), (1330, 6, 0), (52216, 667, 0), (1903468, 38283, 0)],
+    "middlegame": [(46, 0, 0), (1729, 141, 0), (77932, 1433, 0), (3025754, 287639, 0)],
+    "baboons": [(34, 5, 0), (1377, 262, 0), (48012, 6549, 0), (2042272, 356576, 0)],
+    "evolution": [(52, 10, 3), (2714, 581, 0), (142254, 26992, 6884), (7387509, 1571789, 18156)],
+}
+
+
+def setup_position(moves):
+    """Creates a game and plays a list of (from, to, evolve) moves from the start position.
+    Returns: Game (the game after the moves)."""
+    game = Game(None)
+    for from_pos, to_pos, evolve in moves:
+        piece = game.board.get_piece_at_pos(from_pos)
+        capture = 0 if game.board.get_piece_at_pos(to_pos) is None else 1
+        game.make_move(piece, (capture, evolve, to_pos))
+    return game
+
+
+def perft(game, depth):
+    """Counts every move sequence of the given length from the current position.
+    A captured Tortoise ends the game, so no moves are counted below it.
+    Returns: List[Tuple[int, int, int]] (leaf count, captures and evolutions for each depth)."""
+    counts = [[0, 0, 0] for _ in range(depth)]
+    if depth > 0:
+        _perft(game, depth, 0, counts)
+    return [tuple(level) for level in counts]
+
+
+def _perft(game, depth, ply, counts):
+    color = "White" if game.board.turn == 1 else "Black"
+    level = counts[ply]
+    for piece, move in game.generate_moves(color):
+        level[0] += 1
+        level[1] += move[0]
+        level[2] += move[1]
+        if ply + 1 < depth:
+            old_pos = piece.get_position()
+            captuwhite_piece = game.apply_move(piece, move[2], move[1])
+            if not isinstance(captuwhite_piece, Tortoise):
+                _perft(game, depth, ply + 1, counts)
+            game.undo_move(piece, old_pos, captuwhite_piece, move[1])
+
+
+def run_benchmark(max_depth, out=sys.stdout):
+    """Runs perft on every reference position, checks the counts and reports nodes per second.
+    Returns: bool (True if every count matches the reference table)."""
+    all_match = True
+    for name, moves in REFERENCE_POSITIONS.items():
+        game = setup_position(moves)
+        reference = REFERENCE_COUNTS.get(name, [])
+        start_time = time.perf_counter()
+        counts = perft(game, max_depth)
+        elapsed_time = time.perf_counter() - start_time
+
+        total_nodes = sum(level[0] for level in counts)
+        nps = total_nodes / elapsed_time if elapsed_time > 0 else 0.0
+        print(f"{name}: {total_nodes} nodes in {elapsed_time:.3f}s ({nps:,.0f} nps)", file=out)
+        for index, level in enumerate(counts):
+            if index >= len(reference):
+                status = "(no reference)"
+            elif level == reference[index]:
+                status = "ok"
+            else:
+                status = f"MISMATCH, expected {reference[index]}"
+                all_match = False
+            print(
+                f"  depth {index + 1}: {level[0]} leaves, {level[1]} captures, "
+                f"{level[2]} evolutions {status}",
+                file=out,
+            )
+    return all_match
+
+
+if __name__ == "__main__":
+    max_depth = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    sys.exit(0 if run_benchmark(max_depth) else 1)
@@ -4,19 +4,80 @@ import math
 
 Color = Literal["White", "Black"]
 
+# Squares are 0x88 indices: row * 16 + col. A square is off the board when
+# square & 0x88 is non-zero, which also catches every negative index.
+OFF_BOARD = 0x88
+BOARD_SQUARES = [row * 16 + col for row in range(8) for col in range(8)]
+
+# Piece codes stored in Board.squares, positive for White and negative for Black.
+MANDRILL, PYTHON, GIRAFFE, MEERKAT, TORTOISE, CARACAL, BABOON = range(1, 8)
+PIECE_VALUES = [0, 1, 5, 3, 3, 100, 6, 5]
+# Letters of the position notation by code, upper case for White and lower case for Black.
+PIECE_LETTERS = " mpgktcb"
+# Files of the move notation by column; ranks are rows counted from 1.
+FILES = "abcdefgh"
+
+# Shared position tuples and move triples, indexed by square, so move generation
+# does not allocate them.
+SQUARE_POSITIONS = [(square >> 4, square & 7) for square in range(128)]
+QUIET_MOVES = [(0, 0, position) for position in SQUARE_POSITIONS]
+CAPTURE_MOVES = [(1, 0, position) for position in SQUARE_POSITIONS]
+QUIET_EVOLVE_MOVES = [(0, 1, position) for position in SQUARE_POSITIONS]
+CAPTURE_EVOLVE_MOVES = [(1, 1, position) for position in SQUARE_POSITIONS]
+
+ORTHOGONAL = [16, 1, -16, -1]
+DIAGONAL = [17, -15, 15, -17]
+ALL_DIRECTIONS = [16, 1, -16, -1, 17, -15, 15, -17]
+# Forward step and sideways step of each zig-zag direction of the Python.
+PYTHON_STEPS = [(16, 1), (1, 16), (-16, -1), (-1, -16)]
+
+
+def to_square(position) -> int:
+    """Converts a (row, col) position to a 0x88 square index."""
+    return position[0] * 16 + position[1]
+
+
+def add_square_move(square, squares, sign, moves):
+    """Adds a move to a square if it is empty or holds an opponent piece.
+    Returns: None if the move is invalid, True if the square is empty, False if it contains an opponent's piece.
+    """
+    if square & OFF_BOARD:
+        return None
+    code = squares[square]
+    if code == 0:
+        moves.append(QUIET_MOVES[square])
+        return True
+    if code * sign < 0:
+        moves.append(CAPTURE_MOVES[square])
+        return False
+    return None
+
+
+def add_ray_moves(square, squares, sign, step, moves, limit=7):
+    """Adds moves along a ray until it leaves the board or hits a piece."""
+    for _ in range(limit):
+        square += step
+        if add_square_move(square, squares, sign, moves) != True:
+            break
+
 
 class Piece:
     piece_type = None
     piece_value = None
+    code = None
 
     def __init__(self, color: Color, position: tuple):
         self.__color = color
         self.__position = position
+        self.sign = 1 if color == "White" else -1
         if self.piece_type is None:
             raise NotImplementedError("Subclasses must define 'piece_type'.")
 
-    @abstractmethod
     def get_possible_moves(self, position, board):
+        return self.get_square_moves(to_square(position), board.squares)
+
+    @abstractmethod
+    def get_square_moves(self, square, squares):
         pass
 
     def get_color(self) -> Color:
@@ -34,6 +95,9 @@ class Piece:
     def get_piece_value(self):
         return self.piece_value
 
+    def get_board_code(self):
+        return self.code * self.sign
+
     def render(self, screen, tile_size):
         """
         Render the piece's sprite on the Pygame screen.
@@ -46,50 +110,49 @@ class Piece:
 class Mandrill(Piece):
     piece_type = "mandrill"
     piece_value = 1
+    code = MANDRILL
     evolved = False
 
     def __init__(self, color, initial_position):
         super().__init__(color, initial_position)
 
-    def get_possible_moves(self, position, board) -> list:
+    def get_square_moves(self, square, squares) -> list:
         moves = []
-        direction = 1
-        color = self.get_color()
-        steps = 1
-
-        if color == "Black":
-            direction = -1
+        sign = self.sign
 
         if not self.evolved:
-
-            if (position[0] == 6 and color == "Black") or (
-                position[0] == 1 and color == "White"
-            ):
-                steps = 2
+            direction = 16 * sign
+            row = square >> 4
+            steps = 2 if row == (1 if sign > 0 else 6) else 1
+            evolve_row = 7 if sign > 0 else 0
 
             for i in range(1, steps + 1):
-                new_pos = (position[0] + direction * i, position[1])
-                if board.pos_inside_board(new_pos):
-                    if board.pos_is_empty(new_pos):
-                        if self.will_evolve(new_pos):
-                            moves.append((0, 1, new_pos))
-                        moves.append((0, 0, new_pos))
-                    else:
-                        break
-
-            r_pos = (position[0] + direction, position[1] - 1)
-            board.add_eligble_move_mandrill(self, r_pos, moves, self.get_color())
-            l_pos = (position[0] + direction, position[1] + 1)
-            board.add_eligble_move_mandrill(self, l_pos, moves, self.get_color())
+                new_square = square + direction * i
+                if new_square & OFF_BOARD:
+                    continue
+                if squares[new_square] != 0:
+                    break
+                if new_square >> 4 == evolve_row:
+                    moves.append(QUIET_EVOLVE_MOVES[new_square])
+                moves.append(QUIET_MOVES[new_square])
+
+            for new_square in (square + direction - 1, square + direction + 1):
+                if new_square & OFF_BOARD:
+                    continue
+                code = squares[new_square]
+                evolves = new_square >> 4 == evolve_row
+                if code == 0:
+                    if evolves:
+                        moves.append(QUIET_EVOLVE_MOVES[new_square])
+                    moves.append(QUIET_MOVES[new_square])
+                elif code * sign < 0:
+                    if evolves:
+                        moves.append(CAPTURE_EVOLVE_MOVES[new_square])
+                    moves.append(CAPTURE_MOVES[new_square])
 
         else:
-            directions = [(1, 0), (0, 1), (-1, 0), (0, -1)]
-            for d in directions:
-                for i in range(1, 8):
-
-                    new_pos = (position[0] + d[0] * i, position[1] + d[1] * i)
-                    if board.add_eligble_move(new_pos, moves, color) != True:
-                        break
+            for step in ORTHOGONAL:
+                add_ray_moves(square, squares, sign, step, moves)
 
         return moves
 
@@ -97,11 +160,13 @@ class Mandrill(Piece):
         self.evolved = True
         self.piece_type = "baboon"
         self.piece_value = 5
+        self.code = BABOON
 
     def devolve(self):
         self.evolved = False
         self.piece_type = "mandrill"
         self.piece_value = 1
+        self.code = MANDRILL
 
     def will_evolve(self, position):
         """If an mandrill will evolve at a certain position, returns True if evolved else False"""
@@ -116,46 +181,32 @@ class Mandrill(Piece):
 class Python(Piece):
     piece_type = "python"
     piece_value = 5
+    code = PYTHON
 
     def __init__(self, color, initial_position):
         super().__init__(color, initial_position)
 
-    def get_possible_moves(self, position, board) -> list:
+    def get_square_moves(self, square, squares) -> list:
         moves = []
-        directions = [(1, 0), (0, 1), (-1, 0), (0, -1)]
-        for d in directions:
+        sign = self.sign
+        for step, side in PYTHON_STEPS:
             l_path = True
             r_path = True
             for x in range(1, 4):
                 if not l_path and not r_path:
                     break
                 if x % 2 == 0:
-                    new_pos = (position[0] + d[0] * x, position[1] + d[1] * x)
-                    if board.add_eligble_move(new_pos, moves, self.get_color()) != True:
+                    if add_square_move(square + step * x, squares, sign, moves) != True:
                         break
 
                 else:
-
                     if l_path:
-                        l_pos = (
-                            position[0] + x * d[0] + d[1],
-                            position[1] + x * d[1] + d[0],
-                        )
-
-                        if (
-                            board.add_eligble_move(l_pos, moves, self.get_color())
-                            != True
-                        ):
+                        l_square = square + step * x + side
+                        if add_square_move(l_square, squares, sign, moves) != True:
                             l_path = False
                     if r_path:
-                        r_pos = (
-                            position[0] + x * d[0] - d[1],
-                            position[1] + x * d[1] - d[0],
-                        )
-                        if (
-                            board.add_eligble_move(r_pos, moves, self.get_color())
-                            != True
-                        ):
+                        r_square = square + step * x - side
+                        if add_square_move(r_square, squares, sign, moves) != True:
                             r_path = False
         moves = set(moves)
         return moves
@@ -164,25 +215,17 @@ class Python(Piece):
 class Giraffe(Piece):
     piece_type = "giraffe"
     piece_value = 3
+    code = GIRAFFE
 
     def __init__(self, color, initial_position):
         super().__init__(color, initial_position)
 
-    def get_possible_moves(self, position, board):
+    def get_square_moves(self, square, squares):
         moves = []
-        for d in range(-1, 2):
-            for i in range(1, 3):
-                new_pos = position + (i, 0)
-                new_pos = (position[0] + i, position[1])
-                if board.add_eligble_move(new_pos, moves, self.get_color()) != True:
-                    break
-
-        # TODO should probably check whether i really should do it like this with for loop
-        for d in range(-1, 2):
-            for i in range(1, 8):
-                new_pos = (position[0], position[1] + i * d)
-                if board.add_eligble_move(new_pos, moves, self.get_color()) != True:
-                    break
+        sign = self.sign
+        add_ray_moves(square, squares, sign, 16, moves, limit=2)
+        add_ray_moves(square, squares, sign, -1, moves)
+        add_ray_moves(square, squares, sign, 1, moves)
 
         return moves
 
@@ -190,17 +233,17 @@ class Giraffe(Piece):
 class Meerkat(Piece):
     piece_type = "meerkat"
     piece_value = 3
+    code = MEERKAT
 
     def __init__(self, color, initial_position):
         super().__init__(color, initial_position)
 
-    def get_possible_moves(self, position, board):
+    def get_square_moves(self, square, squares):
         moves = []
-        directions = [(1, 0), (0, 1), (-1, 0), (0, -1)]
-        for d in directions:
+        sign = self.sign
+        for step in ORTHOGONAL:
             for i in range(1, 4):
-                new_pos = (position[0] + i * d[0], position[1] + i * d[1])
-                board.add_eligble_move(new_pos, moves, self.get_color())
+                add_square_move(square + i * step, squares, sign, moves)
 
         return moves
 
@@ -208,25 +251,16 @@ class Meerkat(Piece):
 class Tortoise(Piece):
     piece_type = "tortoise"
     piece_value = 100
+    code = TORTOISE
 
     def __init__(self, color, initial_position):
         super().__init__(color, initial_position)
 
-    def get_possible_moves(self, position, board):
+    def get_square_moves(self, square, squares):
         moves = []
-        directions = [
-            (1, 0),
-            (0, 1),
-            (-1, 0),
-            (0, -1),
-            (1, 1),
-            (-1, 1),
-            (1, -1),
-            (-1, -1),
-        ]
-        for d in directions:
-            new_pos = (position[0] + d[0], position[1] + d[1])
-            board.add_eligble_move(new_pos, moves, self.get_color())
+        sign = self.sign
+        for step in ALL_DIRECTIONS:
+            add_square_move(square + step, squares, sign, moves)
 
         return moves
 
@@ -234,22 +268,50 @@ class Tortoise(Piece):
 class Caracal(Piece):
     piece_type = "caracal"
     piece_value = 6
+    code = CARACAL
 
     def __init__(self, color, initial_position):
         super().__init__(color, initial_position)
 
-    def get_possible_moves(self, position, board):
+    def get_square_moves(self, square, squares):
         moves = []
-        directions = [(1, 1), (-1, 1), (1, -1), (-1, -1)]
-        for d in directions:
-            for i in range(1, 8):
-                new_pos = (position[0] + d[0] * i, position[1] + d[1] * i)
-                if board.add_eligble_move(new_pos, moves, self.get_color()) != True:
-                    break
+        sign = self.sign
+        for step in DIAGONAL:
+            add_ray_moves(square, squares, sign, step, moves)
 
-        directions = [(1, 0), (0, 1), (-1, 0), (0, -1)]
-        for d in directions:
-            new_pos = position + d
-            new_pos = (position[0] + d[0], position[1] + d[1])
-            board.add_eligble_move(new_pos, moves, self.get_color())
+        for step in ORTHOGONAL:
+            add_square_move(square + step, squares, sign, moves)
         return moves
+
+
+PIECE_CLASSES = {
+    MANDRILL: Mandrill,
+    PYTHON: Python,
+    GIRAFFE: Giraffe,
+    MEERKAT: Meerkat,
+    TORTOISE: Tortoise,
+    CARACAL: Caracal,
+    BABOON: Mandrill,
+}
+
+
+def create_piece(code, position):
+    """Creates the piece for a board code, evolving Mandrills stored as baboons.
+    Returns: Piece (a new piece at the position)."""
+    color = "White" if code > 0 else "Black"
+    piece = PIECE_CLASSES[abs(code)](color, position)
+    if abs(code) == BABOON:
+        piece.evolve()
+    return piece
+
+
+def format_square(position):
+    """Writes a board position in engine notation.
+    Returns: str (a file letter and a rank number, e.g. "e2")."""
+    return FILES[position[1]] + str(position[0] + 1)
+
+
+def format_move(from_pos, move):
+    """Writes a move in engine notation.
+    Returns: str (the move, e.g. "a2a4" or "g7h8b")."""
+    return format_square(from_pos) + format_square(move[2]) + ("b" if move[1] else "")
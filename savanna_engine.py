@@ -0,0 +1,207 @@
+"""Headless engine speaking a UCI-like line protocol over stdin and stdout.
+
+Commands:
+    isready                          answered with readyok
+    newgame                          forget the transposition table
+    position startpos [moves m ...]  set up the start position and play moves
+    position fen F S [moves m ...]   set up a position written by Board.to_fen
+    go depth N | go movetime MS | go infinite
+    stop                             finish the search and report the best move
+    quit
+
+Moves are written as from and to squares, files a-h for columns and ranks 1-8
+for rows, with a trailing "b" when a Mandrill evolves into a Baboon (a2a4, g7h8b).
+While searching the engine prints "info depth D score cp S nodes N nps X time T
+pv ..." after every iteration, then "bestmove M".
+"""
+
+import math
+import sys
+import threading
+import time
+from logic import Game, Board, MAX_SEARCH_DEPTH
+from pieces import FILES, format_move
+
+
+def parse_square(text):
+    """Reads a square written in engine notation.
+    Returns: Tuple[int, int] (the board position, or None if the text is not a square)."""
+    if len(text) != 2 or text[0] not in FILES or text[1] not in "12345678":
+        return None
+    return int(text[1]) - 1, FILES.index(text[0])
+
+
+def parse_move(game, text):
+    """Finds the move of the side to move that a move in engine notation describes.
+    Returns: Tuple[Piece, Move] (the piece and its move, or None if the move is not legal)."""
+    from_pos = parse_square(text[:2])
+    to_pos = parse_square(text[2:4])
+    if from_pos is None or to_pos is None or text[4:] not in ("", "b"):
+        return None
+    piece = game.board.get_piece_at_pos(from_pos)
+    if piece is None or piece.get_color() != game.get_current_player().get_color():
+        return None
+    evolve = 1 if text[4:] == "b" else 0
+    for move in piece.get_possible_moves(from_pos, game.board):
+        if move[1] == evolve and move[2] == to_pos:
+            return piece, move
+    return None
+
+
+class Engine:
+    """Reads protocol commands and runs the search in a background thread."""
+
+    def __init__(self, out=sys.stdout):
+        """
+        Initialize the engine with a game in the start position.
+
+        Args:
+            out: stream the engine's replies are written to
+        """
+        self.out = out
+        self.output_lock = threading.Lock()
+        self.game = Game(None)
+        self.thread = None
+
+    def send(self, line):
+        """Write one reply line."""
+        with self.output_lock:
+            print(line, file=self.out, flush=True)
+
+    def handle(self, line):
+        """
+        Execute one command line.
+
+        Args:
+            line: the command
+
+        Returns:
+            bool: False once the engine should exit
+        """
+        words = line.split()
+        if not words:
+            return True
+        command, arguments = words[0], words[1:]
+        if command == "quit":
+            self.stop()
+            return False
+        if command == "isready":
+            self.send("readyok")
+        elif command == "newgame":
+            self.stop()
+            self.game.tt.clear()
+        elif command == "position":
+            self.stop()
+            self.set_position(arguments)
+        elif command == "go":
+            self.stop()
+            self.go(arguments)
+        elif command == "stop":
+            self.stop()
+        else:
+            self.send(f"info string unknown command {command}")
+        return True
+
+    def set_position(self, arguments):
+        """Set up the position described by the arguments of a position command."""
+        if arguments and arguments[0] == "startpos":
+            board = Board()
+            board.setup()
+            arguments = arguments[1:]
+        elif arguments and arguments[0] == "fen":
+            try:
+                board = Board.from_fen(" ".join(arguments[1:3]))
+            except ValueError as error:
+                self.send(f"info string {error}")
+                return
+            arguments = arguments[3:]
+        else:
+            self.send("info string expected position startpos or position fen")
+            return
+        self.game.load_board(board)
+        if arguments and arguments[0] == "moves":
+            self.play_moves(arguments[1:])
+
+    def play_moves(self, moves):
+        """Play moves in engine notation, stopping at the first illegal one."""
+        for text in moves:
+            piece_move = parse_move(self.game, text) if not self.game.winner else None
+            if piece_move is None:
+                self.send(f"info string illegal move {text}")
+                return
+            self.game.make_move(*piece_move)
+
+    def go(self, arguments):
+        """Start searching the current position with the limits of a go command."""
+        max_depth = MAX_SEARCH_DEPTH
+        time_budget_ms = math.inf
+        try:
+            if len(arguments) >= 2 and arguments[0] == "depth":
+                max_depth = min(int(arguments[1]), MAX_SEARCH_DEPTH)
+            elif len(arguments) >= 2 and arguments[0] == "movetime":
+                time_budget_ms = float(arguments[1])
+            elif arguments and arguments[0] != "infinite":
+                self.send(f"info string unknown go limit {arguments[0]}")
+                return
+        except ValueError:
+            self.send(f"info string invalid go limit {' '.join(arguments[:2])}")
+            return
+        self.thread = threading.Thread(
+            target=self._search, args=(max_depth, time_budget_ms), daemon=True
+        )
+        self.thread.start()
+
+    def stop(self):
+        """Stop a running search and wait for it to report its best move."""
+        if self.thread is not None:
+            self.game.stop_search()
+            self.thread.join()
+            self.thread = None
+            self.game.stop_requested = False
+
+    def _search(self, max_depth, time_budget_ms):
+        if self.game.winner:
+            self.send("bestmove (none)")
+            return
+        maximizing_player = self.game.board.turn == 0
+        start_time = time.perf_counter()
+
+        def report(depth, score, move):
+            elapsed_time = time.perf_counter() - start_time
+            nodes = self.game.nodes
+            nps = int(nodes / elapsed_time) if elapsed_time > 0 else 0
+            # Scores are Black-positive; report them for the side to move.
+            centipawns = round(score * 100) * (1 if maximizing_player else -1)
+            pv = " ".join(format_move(*stored_move) for stored_move in self.game.pv_moves.values())
+            self.send(
+                f"info depth {depth} score cp {centipawns} nodes {nodes} nps {nps} "
+                f"time {int(elapsed_time * 1000)} pv {pv}"
+            )
+
+        _, best_move, _ = self.game.iterative_deepening(
+            max_depth, time_budget_ms, maximizing_player, on_iteration=report
+        )
+        if best_move is None:
+            # Stopped before the first iteration finished: any legal move beats none.
+            moves = self.game.generate_moves("Black" if maximizing_player else "White")
+            best_move = moves[0] if moves else None
+        if best_move is None:
+            self.send("bestmove (none)")
+        else:
+            piece, move = best_move
+            self.send(f"bestmove {format_move(piece.get_position(), move)}")
+
+
+def main(lines=sys.stdin, out=sys.stdout):
+    """Runs the engine until quit or the end of the input.
+    Returns: None."""
+    engine = Engine(out)
+    for line in lines:
+        if not engine.handle(line):
+            return
+    if engine.thread is not None:
+        engine.thread.join()
+
+
+if __name__ == "__main__":
+    main()
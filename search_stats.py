@@ -0,0 +1,145 @@
+import json
+import sys
+from pieces import format_move
+
+
+class SearchStats:
+    """Counters collected during one iterative deepening search."""
+
+    def __init__(self):
+        self.nodes = 0  # every node searched, including an unfinished last iteration
+        self.helper_nodes = 0  # nodes searched by Lazy SMP helper processes
+        self.nodes_per_depth = []  # nodes searched by each completed iteration
+        self.seconds_per_depth = []  # time taken by each completed iteration
+        self.leaf_evaluations = 0
+        self.beta_cutoffs = 0
+        self.cutoff_indices = []  # number of cutoffs by the index of the move that caused them
+        self.generate_seconds = 0.0  # only measured when Game.profile_search is set
+        self.evaluate_seconds = 0.0
+        self.score = None
+        self.principal_variation = []  # (from_position, move) pairs from the root
+        self.null_move_cutoffs = 0
+        self.reduced_searches = 0
+        self.reduction_researches = 0
+        self.pvs_researches = 0
+        self.fail_highs = 0  # aspiration searches that scored above the window
+        self.fail_lows = 0  # aspiration searches that scored below the window
+
+    def record_iteration(self, nodes, seconds=0.0):
+        """Records the node count and time of a completed iteration.
+        Returns: None."""
+        self.nodes_per_depth.append(nodes)
+        self.seconds_per_depth.append(seconds)
+
+    def record_cutoff(self, index):
+        """Records a beta cutoff caused by the index-th move searched at a node.
+        Returns: None."""
+        self.beta_cutoffs += 1
+        indices = self.cutoff_indices
+        if index >= len(indices):
+            indices.extend([0] * (index + 1 - len(indices)))
+        indices[index] += 1
+
+    def first_move_cutoff_rate(self):
+        """Gets the share of cutoffs caused by the first move searched, a measure of
+        how well the moves are ordered.
+        Returns: float (between 0 and 1, or 0.0 before any cutoff)."""
+        if not self.beta_cutoffs:
+            return 0.0
+        return self.cutoff_indices[0] / self.beta_cutoffs
+
+    def branching_factors(self):
+        """Gets the ratio of nodes between each iteration and the one before it.
+        Returns: List[float] (one factor for every iteration after the first)."""
+        return [
+            nodes / previous
+            for previous, nodes in zip(self.nodes_per_depth, self.nodes_per_depth[1:])
+            if previous
+        ]
+
+    def effective_branching_factor(self):
+        """Gets the effective branching factor, the depth-th root of the nodes
+        searched by the deepest iteration.
+        Returns: float (the branching factor, or 0.0 before any iteration)."""
+        if not self.nodes_per_depth:
+            return 0.0
+        return self.nodes_per_depth[-1] ** (1 / len(self.nodes_per_depth))
+
+    def to_dict(self):
+        """Gets the statistics as plain values.
+        Returns: dict (the counters and branching factors)."""
+        return {
+            "nodes": self.nodes,
+            "helper_nodes": self.helper_nodes,
+            "score": None if self.score is None else round(self.score, 2),
+            "pv": [format_move(from_pos, move) for from_pos, move in self.principal_variation],
+            "nodes_per_depth": self.nodes_per_depth,
+            "seconds_per_depth": [round(seconds, 4) for seconds in self.seconds_per_depth],
+            "branching_factors": [round(factor, 2) for factor in self.branching_factors()],
+            "effective_branching_factor": round(self.effective_branching_factor(), 2),
+            "null_move_cutoffs": self.null_move_cutoffs,
+            "reduced_searches": self.reduced_searches,
+            "reduction_researches": self.reduction_researches,
+            "pvs_researches": self.pvs_researches,
+            "fail_highs": self.fail_highs,
+            "fail_lows": self.fail_lows,
+            "leaf_evaluations": self.leaf_evaluations,
+            "beta_cutoffs": self.beta_cutoffs,
+            "cutoff_indices": self.cutoff_indices,
+            "first_move_cutoff_rate": round(self.first_move_cutoff_rate(), 3),
+            "generate_seconds": round(self.generate_seconds, 4),
+            "evaluate_seconds": round(self.evaluate_seconds, 4),
+        }
+
+    def summary_lines(self):
+        """Gets a few short lines describing the search, for an on-screen overlay.
+        Returns: List[str] (the lines)."""
+        seconds = sum(self.seconds_per_depth)
+        nps = self.nodes / seconds if seconds > 0 else 0
+        lines = [
+            f"depth {len(self.nodes_per_depth)}  nodes {self.nodes}  nps {nps:,.0f}",
+            f"leaves {self.leaf_evaluations}  cutoffs {self.beta_cutoffs}"
+            f" ({self.first_move_cutoff_rate():.0%} first move)",
+            "branching " + " ".join(f"{factor:.1f}" for factor in self.branching_factors()),
+        ]
+        if self.generate_seconds or self.evaluate_seconds:
+            lines.append(
+                f"generate {self.generate_seconds * 1000:.0f} ms"
+                f"  evaluate {self.evaluate_seconds * 1000:.0f} ms"
+            )
+        return lines
+
+
+# Search switches compared by compare_settings, from plain alpha-beta to all of them.
+SETTINGS = {
+    "alpha-beta": {},
+    "pvs": {"use_pvs": True},
+    "null move": {"use_null_move": True},
+    "lmr": {"use_lmr": True},
+    "all": {"use_pvs": True, "use_null_move": True, "use_lmr": True},
+}
+
+
+def compare_settings(depth, out=sys.stdout):
+    """Searches every reference position with each setting in SETTINGS and reports
+    nodes, effective branching factor and best move, one JSON line per search.
+    Returns: None."""
+    from perft import REFERENCE_POSITIONS, setup_position
+
+    for setting, switches in SETTINGS.items():
+        for name, moves in REFERENCE_POSITIONS.items():
+            game = setup_position(moves)
+            for switch, value in switches.items():
+                setattr(game, switch, value)
+            score, best_move, completed_depth = game.iterative_deepening(
+                depth, float("inf"), game.board.turn == 0
+            )
+            line = {"setting": setting, "position": name, "depth": completed_depth}
+            line["score"] = round(score, 2)
+            line["move"] = [best_move[0].get_position(), best_move[1][2]]
+            line.update(game.stats.to_dict())
+            print(json.dumps(line), file=out)
+
+
+if __name__ == "__main__":
+    compare_settings(int(sys.argv[1]) if len(sys.argv) > 1 else 4)
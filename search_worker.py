@@ -0,0 +1,62 @@
+import threading
+
+
+class SearchWorker:
+    """Runs the AI search on a copy of the game in a background thread."""
+
+    def __init__(self, game, max_depth, time_budget_ms, maximizing_player):
+        """
+        Initialize a search worker. The search starts when start() is called.
+
+        Args:
+            game: the Game to search, it is copied so it can be drawn meanwhile
+            max_depth: deepest iteration to search
+            time_budget_ms: time budget of the search in milliseconds
+            maximizing_player: True if the side to move is Black
+        """
+        self.snapshot = game.copy_for_search()
+        self.max_depth = max_depth
+        self.time_budget_ms = time_budget_ms
+        self.maximizing_player = maximizing_player
+        self.result = None
+        self.cancelled = False
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        if not self.cancelled:
+            self.result = self.snapshot.iterative_deepening(
+                self.max_depth, self.time_budget_ms, self.maximizing_player
+            )
+
+    def start(self):
+        """Start searching in the background."""
+        self.thread.start()
+
+    def is_done(self):
+        """
+        Check whether the search has finished.
+
+        Returns:
+            bool: True if the search is no longer running
+        """
+        return not self.thread.is_alive()
+
+    def cancel(self):
+        """Stop the search and discard its result."""
+        self.cancelled = True
+        self.snapshot.stop_search()
+
+    def get_best_move(self, game):
+        """
+        Get the best move found, mapped onto the pieces of the given game.
+
+        Args:
+            game: the Game the search was started from
+
+        Returns:
+            tuple or None: (piece, move) to pass to Game.make_move, or None
+        """
+        if self.cancelled or self.result is None or self.result[1] is None:
+            return None
+        searched_piece, move = self.result[1]
+        return game.board.get_piece_at_pos(searched_piece.get_position()), move
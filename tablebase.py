@@ -0,0 +1,319 @@
+import itertools
+import mmap
+import os
+import sys
+from array import array
+from pieces import TORTOISE, MANDRILL, BABOON, PIECE_LETTERS, create_piece
+
+# A table holds one byte per position: 0 for a draw, otherwise the number of plies
+# until a Tortoise is captured with best play. Odd distances are wins for the side
+# to move, even ones losses. Positions are indexed by the side to move followed by
+# the square (row * 8 + col) of every piece: the White Tortoise, the Black Tortoise,
+# then the other pieces by piece code.
+MAGIC = b"SVTB"
+MAX_OTHER_PIECES = 2
+MAX_DISTANCE = 254
+TABLEBASE_WIN = 1000  # score of a win, less the plies it takes, far above any evaluation
+OTHER_CODES = [
+    sign * code for code in range(1, BABOON + 1) if code != TORTOISE for sign in (-1, 1)
+]
+
+
+def table_name(others) -> str:
+    """Gets the file name of the table for a set of other pieces, White letters
+    then "v" then Black letters (e.g. "CTvt" for a White Caracal).
+    Returns: str (the name, without extension)."""
+    white = sorted(PIECE_LETTERS[code].upper() for code in others if code > 0)
+    black = sorted(PIECE_LETTERS[-code] for code in others if code < 0)
+    return "".join(sorted(white + ["T"])) + "v" + "".join(sorted(black + ["t"]))
+
+
+def position_index(squares, turn) -> int:
+    """Gets the index of a position in its table.
+    Returns: int (the index)."""
+    index = turn
+    for square in squares:
+        index = index * 64 + square
+    return index
+
+
+def materials(other_pieces):
+    """Lists every set of other pieces, in an order where each table only depends
+    on tables listed before it: fewer pieces first, and Baboons before Mandrills,
+    since a Mandrill can evolve into a Baboon.
+    Returns: List[Tuple[int, ...]] (the piece codes of each set, sorted)."""
+    keys = [
+        key
+        for count in range(other_pieces + 1)
+        for key in itertools.combinations_with_replacement(sorted(OTHER_CODES), count)
+    ]
+    keys.sort(key=lambda key: (len(key), sum(abs(code) == MANDRILL for code in key)))
+    return keys
+
+
+class Tablebases:
+    """Endgame tables of the two Tortoises and up to MAX_OTHER_PIECES other pieces,
+    memory-mapped from a directory as they are first needed. Missing tables are
+    simply not probed."""
+
+    def __init__(self, directory):
+        """
+        Initialize the tables of a directory.
+
+        Args:
+            directory: directory holding the table files written by generate_table
+        """
+        self.directory = directory
+        self.tables = {}
+
+    def close(self):
+        """Unmaps every opened table.
+        Returns: None."""
+        for table in self.tables.values():
+            if table is not None:
+                table.close()
+        self.tables = {}
+
+    def _table(self, others):
+        if others not in self.tables:
+            path = os.path.join(self.directory, table_name(others) + ".svtb")
+            table = None
+            if os.path.exists(path):
+                with open(path, "rb") as table_file:
+                    table = mmap.mmap(table_file.fileno(), 0, access=mmap.ACCESS_READ)
+                size = 2 * 64 ** (len(others) + 2)
+                if table[: len(MAGIC)] != MAGIC or len(table) != len(MAGIC) + size:
+                    table.close()
+                    raise ValueError(f"{path} is not a tablebase.")
+            self.tables[others] = table
+        return self.tables[others]
+
+    def value(self, pieces, turn):
+        """Looks up a position given as (code, square) pairs, with both Tortoises.
+        Returns: int (the stored byte, or None if the table is missing)."""
+        pieces = sorted(
+            pieces, key=lambda piece: (0, -piece[0]) if abs(piece[0]) == TORTOISE else (1, piece[0])
+        )
+        others = tuple(code for code, _ in pieces[2:])
+        table = self._table(others)
+        if table is None:
+            return None
+        return table[len(MAGIC) + position_index([square for _, square in pieces], turn)]
+
+    def board_value(self, board):
+        """Looks up the position on a board.
+        Returns: int (the stored byte, or None if the board has too many pieces, is
+        missing a Tortoise or its table is missing)."""
+        white, black = board.piece_lists["White"], board.piece_lists["Black"]
+        if len(white) + len(black) > MAX_OTHER_PIECES + 2:
+            return None
+        squares = board.squares
+        pieces = [
+            (squares[square], (square >> 4) * 8 + (square & 7))
+            for piece_list in (white, black)
+            for square in piece_list
+        ]
+        codes = [code for code, _ in pieces]
+        if TORTOISE not in codes or -TORTOISE not in codes:
+            return None
+        return self.value(pieces, board.turn)
+
+    def probe(self, board):
+        """Gets the exact score of a position on a board, Black positive like
+        Game.evaluate_board.
+        Returns: float (the score, or None if the position is not in the tables)."""
+        value = self.board_value(board)
+        if value is None:
+            return None
+        return score_of(value, board.turn)
+
+    def best_move(self, game):
+        """Finds the move that wins fastest, or failing that draws, or loses slowest.
+        Returns: Tuple[float, Tuple[Piece, Move]] (Black positive score and best move,
+        or None if the position is not in the tables)."""
+        board = game.board
+        if self.board_value(board) is None:
+            return None
+        best_rank, best_distance, best_move = None, 0, None
+        for piece, move in game.get_root_moves():
+            old_pos = piece.get_position()
+            captured_piece = game.apply_move(piece, move[2], move[1])
+            if captured_piece is not None and captured_piece.code == TORTOISE:
+                value = 0
+                distance = 1
+            else:
+                value = self.board_value(board)
+                distance = value + 1 if value else 0
+            game.undo_move(piece, old_pos, captured_piece, move[1])
+            if value is None:
+                return None
+            # Rank wins first, nearest first, then draws, then losses, farthest first.
+            if distance % 2:
+                rank = (2, -distance)
+            elif distance:
+                rank = (0, distance)
+            else:
+                rank = (1, 0)
+            if best_rank is None or rank > best_rank:
+                best_rank, best_distance, best_move = rank, distance, (piece, move)
+        if best_move is None:
+            return None
+        return score_of(best_distance, board.turn), best_move
+
+
+def score_of(value, turn) -> float:
+    """Turns a stored byte into a score, Black positive like Game.evaluate_board.
+    Returns: float (the score)."""
+    if value == 0:
+        return 0
+    score = TABLEBASE_WIN - value if value % 2 else value - TABLEBASE_WIN
+    return score if turn == 0 else -score
+
+
+def generate_table(others, tablebases, out=None):
+    """Solves every position of a table by retrograde analysis and writes it to the
+    directory of tablebases, which must already hold the tables its captures and
+    evolutions lead to. Moves staying in the table are collected once, then the
+    results spread backwards from the won and lost positions in order of distance,
+    so each position gets the distance of best play.
+    Returns: bytes (the table)."""
+    codes = [TORTOISE, -TORTOISE] + list(others)
+    count = len(codes)
+    size = 2 * 64**count
+    turn_step = 64**count
+    weights = [64 ** (count - 1 - index) for index in range(count)]
+    pieces = [create_piece(code, (0, 0)) for code in codes]
+    squares = array("b", bytes(128))
+
+    values = bytearray(size)
+    counters = array("H", bytes(2 * size))  # moves staying in the table, not yet known as wins
+    external_max = bytearray(size)  # farthest win among moves leaving the table
+    blocked = bytearray(size)  # positions with a move that draws or wins, so never lost
+    offsets = array("I", bytes(4 * (size + 1)))
+    successors = array("I")
+    buckets = [[] for _ in range(MAX_DISTANCE + 2)]
+
+    for index, position in enumerate(itertools.product(range(2), *[range(64)] * count)):
+        turn, board_squares = position[0], position[1:]
+        offsets[index] = len(successors)
+        if len(set(board_squares)) < count:
+            continue
+        sign = 1 if turn == 1 else -1
+        for code, square in zip(codes, board_squares):
+            squares[(square >> 3) * 16 + (square & 7)] = code
+
+        wins_now = False
+        nearest_loss = MAX_DISTANCE + 1
+        moves_found = False
+        for mover, (code, piece) in enumerate(zip(codes, pieces)):
+            if code * sign < 0:
+                continue
+            from_square = board_squares[mover]
+            for capture, evolve, (to_row, to_col) in piece.get_square_moves(
+                (from_square >> 3) * 16 + (from_square & 7), squares
+            ):
+                moves_found = True
+                to_square = to_row * 8 + to_col
+                if capture and abs(squares[to_row * 16 + to_col]) == TORTOISE:
+                    wins_now = True
+                    break
+                if not capture and not evolve:
+                    successors.append(
+                        index - sign * turn_step + (to_square - from_square) * weights[mover]
+                    )
+                    continue
+                child = [
+                    (other_code, other_square)
+                    for other, (other_code, other_square) in enumerate(zip(codes, board_squares))
+                    if other != mover and other_square != to_square
+                ]
+                child.append((sign * BABOON if evolve else code, to_square))
+                value = tablebases.value(child, 1 - turn)
+                if value is None:
+                    raise ValueError(f"Table {table_name(others)} needs a missing table.")
+                if value == 0:
+                    blocked[index] = 1
+                elif value % 2:
+                    external_max[index] = max(external_max[index], value)
+                else:
+                    blocked[index] = 1
+                    nearest_loss = min(nearest_loss, value)
+            if wins_now:
+                break
+
+        for square in board_squares:
+            squares[(square >> 3) * 16 + (square & 7)] = 0
+        if wins_now:
+            buckets[1].append(index)
+            del successors[offsets[index] :]
+            continue
+        counters[index] = len(successors) - offsets[index]
+        if nearest_loss <= MAX_DISTANCE:
+            buckets[nearest_loss + 1].append(index)
+        elif moves_found and not counters[index] and not blocked[index]:
+            buckets[external_max[index] + 1].append(index)
+    offsets[size] = len(successors)
+
+    # Invert the moves staying in the table into predecessor lists.
+    predecessor_offsets = array("I", bytes(4 * (size + 1)))
+    for successor in successors:
+        predecessor_offsets[successor + 1] += 1
+    for index in range(size):
+        predecessor_offsets[index + 1] += predecessor_offsets[index]
+    predecessors = array("I", bytes(4 * len(successors)))
+    filled = array("I", predecessor_offsets[:size])
+    for index in range(size):
+        for position in range(offsets[index], offsets[index + 1]):
+            successor = successors[position]
+            predecessors[filled[successor]] = index
+            filled[successor] += 1
+    del successors, filled
+
+    for distance in range(1, MAX_DISTANCE + 1):
+        for index in buckets[distance]:
+            if values[index]:
+                continue
+            values[index] = distance
+            for position in range(predecessor_offsets[index], predecessor_offsets[index + 1]):
+                predecessor = predecessors[position]
+                if values[predecessor]:
+                    continue
+                if distance % 2 == 0:
+                    buckets[distance + 1].append(predecessor)
+                    continue
+                counters[predecessor] -= 1
+                if not counters[predecessor] and not blocked[predecessor]:
+                    buckets[max(distance, external_max[predecessor]) + 1].append(predecessor)
+        buckets[distance] = []
+    if any(not values[index] for index in buckets[MAX_DISTANCE + 1]):
+        raise ValueError(f"Table {table_name(others)} has wins longer than {MAX_DISTANCE} plies.")
+
+    path = os.path.join(tablebases.directory, table_name(others) + ".svtb")
+    with open(path, "wb") as table_file:
+        table_file.write(MAGIC)
+        table_file.write(values)
+    if out is not None:
+        decided = sum(1 for value in values if value)
+        print(f"{table_name(others)}: {decided} of {size} positions decided", file=out)
+    return bytes(values)
+
+
+def generate_all(other_pieces, directory, out=sys.stdout):
+    """Generates every table with up to other_pieces pieces besides the Tortoises,
+    skipping tables already in the directory.
+    Returns: None."""
+    os.makedirs(directory, exist_ok=True)
+    tablebases = Tablebases(directory)
+    try:
+        for others in materials(other_pieces):
+            if os.path.exists(os.path.join(directory, table_name(others) + ".svtb")):
+                continue
+            generate_table(others, tablebases, out)
+    finally:
+        tablebases.close()
+
+
+if __name__ == "__main__":
+    other_pieces = int(sys.argv[1]) if len(sys.argv) > 1 else 1
+    directory = sys.argv[2] if len(sys.argv) > 2 else "tablebases"
+    generate_all(min(other_pieces, MAX_OTHER_PIECES), directory)
@@ -1,5 +1,47 @@
+import io
+import json
+import multiprocessing
+import os
+import tempfile
 import unittest
-from logic import Board, Ape, Snake, Crab, Meerkat, Lynx
+from logic import Game, Board, WIN_SCORE
+from pieces import Mandrill, Python, Giraffe, Meerkat, Caracal, Tortoise, TORTOISE, MEERKAT, CARACAL
+from perft import REFERENCE_POSITIONS, REFERENCE_COUNTS, setup_position, perft
+from search_worker import SearchWorker
+from savanna_engine import Engine, format_move, parse_move
+import bitboard
+import parallel_search
+from parallel_search import RootParallelSearch, LazySMPSearch, search_settings, apply_settings
+from transposition import SharedTranspositionTable, LOWER_BOUND, EXACT
+from tablebase import Tablebases, generate_table, TABLEBASE_WIN
+from opening_book import OpeningBook, build_book, write_book
+from tournament import random_openings, play_game, run_tournament, elo_difference
+
+
+def targets(piece, board):
+    return sorted(move[2] for move in piece.get_possible_moves(piece.get_position(), board))
+
+
+def shuttle_move(game):
+    """Finds a quiet move of the side to move that the same piece can play back.
+    Returns: Tuple (the move and the move back, as stored in the transposition table)."""
+    board = game.board
+    for from_pos, moves in sorted(game.get_legal_moves().items()):
+        piece = board.get_piece_at_pos(from_pos)
+        for move in moves:
+            if move[1] or board.get_piece_at_pos(move[2]) is not None:
+                continue
+            game.apply_move(piece, move[2], move[1])
+            back = [
+                back_move
+                for back_move in piece.get_possible_moves(move[2], board)
+                if back_move[2] == from_pos and not back_move[1]
+            ]
+            game.undo_move(piece, from_pos, None, move[1])
+            if back:
+                return (from_pos, move), (move[2], back[0])
+    return None
+
 
 class TestBoard(unittest.TestCase):
     def setUp(self):
@@ -13,11 +55,11 @@ class TestBoard(unittest.TestCase):
     def test_pos_is_empty(self):
         position = (3, 3)
         self.assertTrue(self.board.pos_is_empty(position))
-        
+
     def test_place_piece(self):
-        ape = Ape("red", (3, 3))
-        self.board.place_piece(ape, (3, 3))
-        self.assertEqual(self.board.get_piece_at_pos((3, 3)), ape)
+        mandrill = Mandrill("White", (3, 3))
+        self.board.place_piece(mandrill, (3, 3))
+        self.assertEqual(self.board.get_piece_at_pos((3, 3)), mandrill)
         self.assertFalse(self.board.pos_is_empty((3, 3)))
 
     def test_pos_inside_board(self):
@@ -26,73 +68,622 @@ class TestBoard(unittest.TestCase):
         self.assertFalse(self.board.pos_inside_board((8, 8)))
         self.assertFalse(self.board.pos_inside_board((-1, 0)))
 
-class TestApe(unittest.TestCase):
+    def test_incremental_hash_matches_rebuild(self):
+        game = setup_position(REFERENCE_POSITIONS["baboons"])
+        incremental_hash = game.board.hash
+        game.board.rebuild()
+        self.assertEqual(game.board.hash, incremental_hash)
+
+    def test_incremental_evaluation_matches_full_scan(self):
+        for name in ("baboons", "evolution"):
+            with self.subTest(position=name):
+                game = setup_position(REFERENCE_POSITIONS[name])
+                game.debug_evaluation = True
+                self.assertAlmostEqual(game.evaluate_board(), game.evaluate_board_full())
+                game.minimax(2, -float("inf"), float("inf"), game.board.turn == 0)
+                self.assertAlmostEqual(game.evaluate_board(), game.evaluate_board_full())
+
+    def test_codes_round_trip(self):
+        board = setup_position(REFERENCE_POSITIONS["baboons"]).board
+        copy = Board.from_codes(board.to_codes())
+        self.assertEqual(copy.hash, board.hash)
+        self.assertEqual(copy.get_piece_at_pos((0, 5)).piece_type, "baboon")
+
+    def test_fen_and_bytes_round_trip(self):
+        start = Board()
+        start.setup()
+        self.assertEqual(start.to_fen(), "kpcgtcpk/mmmmmmmm/8/8/8/8/MMMMMMMM/KPCTGCPK w")
+        for name, moves in REFERENCE_POSITIONS.items():
+            with self.subTest(position=name):
+                board = setup_position(moves).board
+                self.assertEqual(len(board.to_bytes()), 33)
+                for copy in (Board.from_fen(board.to_fen()), Board.from_bytes(board.to_bytes())):
+                    self.assertEqual(copy.to_codes(), board.to_codes())
+                    self.assertEqual(copy.hash, board.hash)
+
+    def test_invalid_fen(self):
+        for text in ("", "8/8/8/8/8/8/8/8", "8/8/8/8/8/8/8/9 w", "8/8/8/8/8/8/8/x7 w", "8/8 b"):
+            with self.subTest(text=text):
+                with self.assertRaises(ValueError):
+                    Board.from_fen(text)
+
+    def test_invalid_packed_boards(self):
+        start = Board()
+        start.setup()
+        packed = start.to_bytes()
+        for data in (
+            packed[:32] + bytes([2]),
+            bytes([0x80]) + packed[1:],
+            start.to_codes()[:64] + bytes([7]),
+            start.to_codes()[:64],
+        ):
+            with self.subTest(data=data):
+                with self.assertRaises(ValueError):
+                    if len(data) == 33:
+                        Board.from_bytes(data)
+                    else:
+                        Board.from_codes(data)
+        with self.assertRaises(ValueError):
+            Board.from_code_list([8] + [0] * 63, 1)
+
+class TestMandrill(unittest.TestCase):
     def setUp(self):
         self.board = Board()
-        self.ape = Ape("blue", (6, 5))
-        self.board.place_piece(self.ape, (6, 5))
+        self.mandrill = Mandrill("Black", (6, 5))
+        self.board.place_piece(self.mandrill, (6, 5))
 
-    def test_ape_possible_moves(self):
-        moves = self.ape.get_possible_moves(self.ape.get_position(), self.board)
+    def test_mandrill_possible_moves(self):
         expected_moves = [(5, 5), (5, 4), (4, 5), (5, 6)]
-        self.assertEqual(sorted(moves), sorted(expected_moves))
+        self.assertEqual(targets(self.mandrill, self.board), sorted(expected_moves))
 
-class TestSnake(unittest.TestCase):
+    def test_mandrill_evolves_on_last_row(self):
+        self.board.move_piece(self.mandrill, (1, 5), 0)
+        moves = self.mandrill.get_possible_moves((1, 5), self.board)
+        self.assertIn((0, 1, (0, 5)), moves)
+        self.assertIn((0, 0, (0, 5)), moves)
+
+class TestPython(unittest.TestCase):
     def setUp(self):
         self.board = Board()
-        self.snake = Snake("blue", (4, 4))
-        self.board.place_piece(self.snake, (4, 4))
+        self.python = Python("Black", (4, 4))
+        self.board.place_piece(self.python, (4, 4))
 
-    def test_snake_possible_moves(self):
-        moves = self.snake.get_possible_moves(self.snake.get_position(), self.board)
-        expected_moves = [(5, 5), (3, 3), (3, 5), (5, 3), (6, 4), (2, 4), (4, 6), (4, 2), 
-                          (7, 5), (7, 3), (1, 5), (1, 3), (5, 7), (3, 7), (5, 1), (3, 1),
-                          (4, 0), (0, 4)]
-        self.assertEqual(sorted(moves), sorted(expected_moves))
+    def test_python_possible_moves(self):
+        expected_moves = [(5, 5), (3, 3), (3, 5), (5, 3), (6, 4), (2, 4), (4, 6), (4, 2),
+                          (7, 5), (7, 3), (1, 5), (1, 3), (5, 7), (3, 7), (5, 1), (3, 1)]
+        self.assertEqual(targets(self.python, self.board), sorted(expected_moves))
 
-    def test_snake_corner_possible_moves(self):
-        self.board.move_piece(self.snake,(7,7))
-        moves = self.snake.get_possible_moves(self.snake.get_position(), self.board)
-        expected_moves = [(6, 6), (7, 5), (6, 4), (7, 3), (6, 2), (5, 7), (4, 6), (3, 7), (2, 6)]
-        self.assertEqual(sorted(moves),sorted(expected_moves)) 
+    def test_python_corner_possible_moves(self):
+        self.board.move_piece(self.python, (7, 7), 0)
+        expected_moves = [(6, 6), (7, 5), (6, 4), (5, 7), (4, 6)]
+        self.assertEqual(targets(self.python, self.board), sorted(expected_moves))
 
 
-class TestCrab(unittest.TestCase):
+class TestGiraffe(unittest.TestCase):
     def setUp(self):
         self.board = Board()
-        self.crab = Crab("red", (4, 4))
-        self.board.place_piece(self.crab, (4, 4))
+        self.giraffe = Giraffe("White", (4, 4))
+        self.board.place_piece(self.giraffe, (4, 4))
 
-    def test_crab_possible_moves(self):
-        moves = self.crab.get_possible_moves(self.crab.get_position(), self.board)
-        expected_moves = [(3, 4), (5, 4), (4,3), (4,2), (4,1), (4,0), (4,5), (4,6), (4,7)]
-        self.assertEqual(sorted(moves), sorted(expected_moves))
+    def test_giraffe_possible_moves(self):
+        expected_moves = [(5, 4), (6, 4), (4, 3), (4, 2), (4, 1), (4, 0), (4, 5), (4, 6), (4, 7)]
+        self.assertEqual(targets(self.giraffe, self.board), sorted(expected_moves))
 
 class TestMeerkat(unittest.TestCase):
     def setUp(self):
         self.board = Board()
-        self.meerkat = Meerkat("blue", (3, 3))
+        self.meerkat = Meerkat("Black", (3, 3))
         self.board.place_piece(self.meerkat, (3, 3))
 
     def test_meerkat_possible_moves(self):
-        moves = self.meerkat.get_possible_moves(self.meerkat.get_position(), self.board)
-        expected_moves = [(4, 3), (5, 3), (2, 3), (1, 3), (3, 4), (3, 5), (3, 2), (3, 1)]
-        self.assertEqual(sorted(moves), sorted(expected_moves))
+        expected_moves = [(4, 3), (5, 3), (6, 3), (2, 3), (1, 3), (0, 3),
+                          (3, 4), (3, 5), (3, 6), (3, 2), (3, 1), (3, 0)]
+        self.assertEqual(targets(self.meerkat, self.board), sorted(expected_moves))
 
-class TestLynx(unittest.TestCase):
+class TestCaracal(unittest.TestCase):
     def setUp(self):
         self.board = Board()
-        self.lynx = Lynx("red", (3, 3))
-        self.board.place_piece(self.lynx, (3, 3))
+        self.caracal = Caracal("White", (3, 3))
+        self.board.place_piece(self.caracal, (3, 3))
 
-    def test_lynx_possible_moves(self):
-        moves = self.lynx.get_possible_moves(self.lynx.get_position(), self.board)
+    def test_caracal_possible_moves(self):
         expected_moves = [
             (4, 3), (2, 3), (3, 4), (3, 2), (4, 4), (5, 5), (6, 6), (7, 7),
             (2, 2), (1, 1), (0, 0), (2, 4), (1, 5), (0, 6), (4, 2), (5, 1),
-            (6, 0),               
+            (6, 0),
         ]
-        self.assertEqual(sorted(moves), sorted(expected_moves))
+        self.assertEqual(targets(self.caracal, self.board), sorted(expected_moves))
+
+
+class TestPerft(unittest.TestCase):
+    def test_reference_counts(self):
+        for name, moves in REFERENCE_POSITIONS.items():
+            with self.subTest(position=name):
+                game = setup_position(moves)
+                self.assertEqual(perft(game, 3), REFERENCE_COUNTS[name][:3])
+
+    def test_bitboard_generator_matches_piece_generators(self):
+        for name, moves in REFERENCE_POSITIONS.items():
+            game = setup_position(moves)
+            for color in ("White", "Black"):
+                with self.subTest(position=name, color=color):
+                    generated = sorted(
+                        (piece.get_position(), move)
+                        for piece, move in game.generate_moves(color)
+                    )
+                    expected = sorted(
+                        (piece.get_position(), move)
+                        for piece in game.board.piece_lists[color].values()
+                        for move in piece.get_possible_moves(piece.get_position(), game.board)
+                    )
+                    self.assertEqual(generated, expected)
+
+
+class TestHistory(unittest.TestCase):
+    def test_step_back_and_forward_restore_positions(self):
+        game = setup_position(REFERENCE_POSITIONS["baboons"])
+        final_hash = game.board.hash
+        for _ in range(len(REFERENCE_POSITIONS["baboons"])):
+            game.step_back()
+        self.assertTrue(game.viewing_mode)
+        self.assertEqual(game.board.hash, setup_position([]).board.hash)
+        game.step_forward()
+        self.assertEqual(game.board.hash, setup_position(REFERENCE_POSITIONS["baboons"][:1]).board.hash)
+        game.step_to_front()
+        self.assertFalse(game.viewing_mode)
+        self.assertEqual(game.board.hash, final_hash)
+
+    def test_legal_moves_follow_the_position(self):
+        game = setup_position(REFERENCE_POSITIONS["middlegame"])
+
+        def expected_moves():
+            color = "White" if game.board.turn == 1 else "Black"
+            return {
+                piece.get_position(): sorted(piece.get_possible_moves(piece.get_position(), game.board))
+                for piece in game.board.piece_lists[color].values()
+                if piece.get_possible_moves(piece.get_position(), game.board)
+            }
+
+        def cached_moves():
+            return {square: sorted(moves) for square, moves in game.get_legal_moves().items()}
+
+        self.assertEqual(cached_moves(), expected_moves())
+        self.assertIs(game.get_legal_moves(), game.get_legal_moves())
+        game.iterative_deepening(2, 60000, game.board.turn == 0)
+        self.assertEqual(cached_moves(), expected_moves())
+        game.step_back()
+        self.assertEqual(cached_moves(), expected_moves())
+        game.step_forward()
+        piece, move = game.get_root_moves()[0]
+        game.make_move(piece, move)
+        self.assertEqual(cached_moves(), expected_moves())
+        snapshot = game.copy_for_search()
+        for piece, move in snapshot.get_root_moves():
+            self.assertIs(snapshot.board.get_piece_at_pos(piece.get_position()), piece)
+
+
+class TestSearch(unittest.TestCase):
+    def test_iterative_deepening_matches_fixed_depth(self):
+        game = setup_position(REFERENCE_POSITIONS["middlegame"])
+        score, best_move, depth = game.iterative_deepening(3, 60000, False)
+        fresh_game = setup_position(REFERENCE_POSITIONS["middlegame"])
+        expected_score, expected_move = fresh_game.minimax(3, -float("inf"), float("inf"), False)
+        self.assertEqual(depth, 3)
+        self.assertEqual(score, expected_score)
+        self.assertEqual(best_move[1], expected_move[1])
+        self.assertEqual(best_move[0].get_position(), expected_move[0].get_position())
+
+    def test_principal_variation_stops_at_a_repeated_position(self):
+        game = setup_position(REFERENCE_POSITIONS["middlegame"])
+        board = game.board
+        start = board.hash
+        # Each side moves a piece to an empty square and back, repeating the position.
+        line = []
+        for _ in range(2):
+            forward, back = shuttle_move(game)
+            line.insert(len(line) // 2, forward)
+            line.append(back)
+            piece, move = game.resolve_move(forward)
+            game.apply_move(piece, move[2], move[1])
+        for from_pos, move in reversed(line[:2]):
+            game.undo_move(board.get_piece_at_pos(move[2]), from_pos, None, False)
+
+        for stored_move in line:
+            game.tt.store(board.hash, 1, 0, EXACT, stored_move)
+            piece, move = game.resolve_move(stored_move)
+            game.apply_move(piece, move[2], move[1])
+        self.assertEqual(board.hash, start)
+
+        pv_moves = game.get_principal_variation(8)
+        self.assertEqual(list(pv_moves.values()), line)
+
+    def test_aspiration_failures_are_researched(self):
+        game = setup_position(REFERENCE_POSITIONS["middlegame"])
+        game.aspiration_window = 0.001
+        score, best_move, depth = game.iterative_deepening(3, 60000, False)
+        open_game = setup_position(REFERENCE_POSITIONS["middlegame"])
+        open_game.aspiration_window = None
+        expected_score, _, _ = open_game.iterative_deepening(3, 60000, False)
+        self.assertGreater(game.stats.fail_highs + game.stats.fail_lows, 0)
+        self.assertAlmostEqual(score, expected_score)
+
+    def test_quiescence_sees_recapture(self):
+        board = Board()
+        for piece in (
+            Tortoise("White", (0, 0)),
+            Tortoise("Black", (7, 7)),
+            Meerkat("White", (3, 3)),
+            Mandrill("Black", (4, 3)),
+            Meerkat("Black", (4, 6)),
+        ):
+            board.place_piece(piece, piece.get_position())
+        for use_quiescence, expected_capture in ((False, 1), (True, 0)):
+            with self.subTest(use_quiescence=use_quiescence):
+                game = Game(None)
+                game.load_board(Board.from_codes(board.to_codes()))
+                game.use_quiescence = use_quiescence
+                _, (piece, move) = game.minimax(1, -float("inf"), float("inf"), False)
+                self.assertEqual(move[0], expected_capture)
+
+    def test_move_ordering_uses_captures_killers_and_history(self):
+        game = setup_position(REFERENCE_POSITIONS["baboons"])
+        moves = game.generate_moves("White")
+        quiet = [(piece, move) for piece, move in moves if not move[0] and not move[1]]
+        killer_piece, killer_move = quiet[-1]
+        history_piece, history_move = quiet[-2]
+        game.record_cutoff(killer_piece, killer_piece.get_position(), killer_move, 1, 3)
+        game.record_cutoff(history_piece, history_piece.get_position(), history_move, 4, 0)
+        ordered = game.order_moves(list(moves), game.board.hash, None, ply=3)
+        captures = [move for move in ordered if move[1][0]]
+        self.assertEqual(ordered[: len(captures)], captures)
+        self.assertEqual(ordered[len(captures)], (killer_piece, killer_move))
+        self.assertEqual(ordered[len(captures) + 1], (history_piece, history_move))
+
+    def test_pvs_keeps_score_and_pruning_finds_legal_moves(self):
+        expected_score, _ = setup_position(REFERENCE_POSITIONS["middlegame"]).minimax(
+            3, -float("inf"), float("inf"), False
+        )
+        for switch in ("use_pvs", "use_null_move", "use_lmr"):
+            with self.subTest(switch=switch):
+                game = setup_position(REFERENCE_POSITIONS["middlegame"])
+                setattr(game, switch, True)
+                score, (piece, move), depth = game.iterative_deepening(3, 60000, False)
+                self.assertEqual(depth, 3)
+                self.assertEqual(len(game.stats.nodes_per_depth), 3)
+                self.assertIn(move, piece.get_possible_moves(piece.get_position(), game.board))
+                if switch == "use_pvs":
+                    self.assertAlmostEqual(score, expected_score)
+
+    def test_search_stats_are_collected(self):
+        game = setup_position(REFERENCE_POSITIONS["middlegame"])
+        game.profile_search = True
+        score, best_move, depth = game.iterative_deepening(3, 60000, False)
+        stats = game.stats
+        self.assertEqual(stats.nodes, sum(stats.nodes_per_depth))
+        self.assertEqual(len(stats.seconds_per_depth), depth)
+        self.assertGreater(stats.leaf_evaluations, 0)
+        self.assertEqual(stats.beta_cutoffs, sum(stats.cutoff_indices))
+        self.assertGreater(stats.generate_seconds, 0)
+        self.assertEqual(stats.principal_variation[0], (best_move[0].get_position(), best_move[1]))
+        line = json.loads(json.dumps(stats.to_dict()))
+        self.assertEqual(line["pv"][0], format_move(best_move[0].get_position(), best_move[1]))
+        self.assertEqual(line["score"], round(score, 2))
+        self.assertEqual(len(stats.summary_lines()), 4)
+
+    def test_square_attacked_matches_generated_captures(self):
+        board = setup_position(REFERENCE_POSITIONS["baboons"]).board
+        for color, enemy in (("White", "Black"), ("Black", "White")):
+            for row in range(8):
+                for col in range(8):
+                    if board.get_piece_at_pos((row, col)) is not None:
+                        continue
+                    with self.subTest(color=color, square=(row, col)):
+                        test_board = Board.from_codes(board.to_codes())
+                        test_board.place_piece(Meerkat(enemy, (row, col)), (row, col))
+                        captures = bitboard.generate_moves(test_board, color, captures_only=True)
+                        expected = any(move[2] == (row, col) for _, move in captures)
+                        self.assertEqual(
+                            bitboard.square_attacked(test_board, row * 8 + col, color), expected
+                        )
+
+    def test_search_worker_leaves_game_untouched(self):
+        game = setup_position(REFERENCE_POSITIONS["opening"])
+        board_hash = game.board.hash
+        worker = SearchWorker(game, 2, 60000, False)
+        worker.start()
+        worker.thread.join()
+        piece, move = worker.get_best_move(game)
+        self.assertEqual(game.board.hash, board_hash)
+        self.assertIs(game.board.get_piece_at_pos(piece.get_position()), piece)
+        self.assertIn(move, piece.get_possible_moves(piece.get_position(), game.board))
+
+    def test_root_parallel_search_matches_serial(self):
+        root_search = RootParallelSearch(2)
+        try:
+            for name, use_quiescence in (
+                ("opening", True),
+                ("evolution", True),
+                ("middlegame", False),
+            ):
+                with self.subTest(position=name, use_quiescence=use_quiescence):
+                    game = setup_position(REFERENCE_POSITIONS[name])
+                    game.use_quiescence = use_quiescence
+                    maximizing_player = game.board.turn == 0
+                    score, best_move = root_search.search(game, 3, maximizing_player)
+                    serial_game = setup_position(REFERENCE_POSITIONS[name])
+                    serial_game.use_quiescence = use_quiescence
+                    expected_score, expected_move = serial_game.minimax(
+                        3, -float("inf"), float("inf"), maximizing_player
+                    )
+                    self.assertEqual(score, expected_score)
+                    self.assertEqual(best_move[1], expected_move[1])
+                    self.assertEqual(
+                        best_move[0].get_position(), expected_move[0].get_position()
+                    )
+        finally:
+            root_search.shutdown()
+
+    def test_root_parallel_worker_resets_between_root_searches(self):
+        parallel_search._init_worker(multiprocessing.Value("d", 0.0))
+        game = setup_position(REFERENCE_POSITIONS["opening"])
+        maximizing_player = game.board.turn == 0
+        piece, move = game.order_moves(game.get_root_moves(), game.board.hash, None)[0]
+        job = (game.board.to_bytes(), piece.get_position(), move, 3, maximizing_player,
+               None, search_settings(game))
+        worker_game = parallel_search._worker_game
+        generations = []
+        for search_id in (1, 1, 2):
+            worker_game.killers[1][0] = "stale"
+            parallel_search._search_move(search_id, *job)
+            generations.append(worker_game.tt.generation)
+            if search_id == 2:
+                self.assertNotIn("stale", worker_game.killers[1])
+        self.assertEqual(generations, [1, 1, 2])
+
+    def test_lazy_smp_search_matches_serial_score(self):
+        lazy_search = LazySMPSearch(2, table_size=1 << 14)
+        try:
+            game = setup_position(REFERENCE_POSITIONS["middlegame"])
+            score, best_move = lazy_search.search(game, 3, False)
+            serial_game = setup_position(REFERENCE_POSITIONS["middlegame"])
+            expected_score, _ = serial_game.minimax(3, -float("inf"), float("inf"), False)
+            self.assertEqual(score, expected_score)
+            piece, move = best_move
+            self.assertIn(move, piece.get_possible_moves(piece.get_position(), game.board))
+        finally:
+            lazy_search.shutdown()
+
+    def test_lazy_smp_search_survives_a_dead_helper(self):
+        lazy_search = LazySMPSearch(1, table_size=1 << 14)
+        try:
+            lazy_search.processes[0].terminate()
+            lazy_search.processes[0].join()
+            game = setup_position(REFERENCE_POSITIONS["opening"])
+            score, best_move = lazy_search.search(game, 2, game.board.turn == 0)
+            piece, move = best_move
+            self.assertIn(move, piece.get_possible_moves(piece.get_position(), game.board))
+        finally:
+            lazy_search.shutdown()
+
+    def test_lazy_smp_search_advances_shared_generation(self):
+        lazy_search = LazySMPSearch(1, table_size=1 << 14)
+        try:
+            game = setup_position(REFERENCE_POSITIONS["opening"])
+            game.root_search = lazy_search
+            generations = []
+            for _ in range(2):
+                snapshot = game.copy_for_search()
+                maximizing_player = snapshot.board.turn == 0
+                _, best_move, _ = snapshot.iterative_deepening(2, 60000, maximizing_player)
+                generations.append(lazy_search.table.generation)
+                piece, move = best_move
+                game.make_move(game.board.get_piece_at_pos(piece.get_position()), move)
+            self.assertGreater(generations[0], 0)
+            self.assertGreater(generations[1], generations[0])
+        finally:
+            lazy_search.shutdown()
+
+
+class TestSharedTranspositionTable(unittest.TestCase):
+    def setUp(self):
+        self.table = SharedTranspositionTable(1 << 4)
+
+    def tearDown(self):
+        self.table.close()
+        self.table.unlink()
+
+    def test_entry_round_trip(self):
+        move = ((6, 3), (1, 1, (7, 2)))
+        self.table.store(12345, 4, -0.37, LOWER_BOUND, move)
+        attached = SharedTranspositionTable(1 << 4, self.table.shm.name)
+        try:
+            self.assertEqual(attached.probe(12345), (12345, 4, -0.37, LOWER_BOUND, move, 0))
+            self.assertIsNone(attached.probe(12345 + (1 << 4)))
+        finally:
+            attached.close()
+
+    def test_torn_entry_is_ignored(self):
+        self.table.store(12345, 4, 1.5, LOWER_BOUND, None)
+        base = 1 + (12345 & self.table.mask) * self.table.WORDS_PER_ENTRY
+        self.table.scores[base + 1] = 2.5
+        self.assertIsNone(self.table.probe(12345))
+
+
+
+class TestEngine(unittest.TestCase):
+    def test_move_notation_round_trip(self):
+        game = setup_position(REFERENCE_POSITIONS["baboons"])
+        for piece, move in game.generate_moves("White"):
+            with self.subTest(move=move):
+                text = format_move(piece.get_position(), move)
+                self.assertEqual(parse_move(game, text), (piece, move))
+
+    def test_position_and_go(self):
+        out = io.StringIO()
+        engine = Engine(out)
+        engine.handle("position startpos moves a2a4 a7a5 a4a5")
+        engine.handle("go depth 2")
+        engine.thread.join()
+        lines = out.getvalue().splitlines()
+        self.assertEqual(lines[0], "info string illegal move a4a5")
+        self.assertTrue(lines[1].startswith("info depth 1 score cp"))
+        self.assertTrue(lines[2].startswith("info depth 2 "))
+        self.assertTrue(lines[-1].startswith("bestmove "))
+        piece_move = parse_move(engine.game, lines[-1].split()[1])
+        self.assertIsNotNone(piece_move)
+
+    def test_invalid_go_limit(self):
+        out = io.StringIO()
+        engine = Engine(out)
+        engine.handle("go depth x")
+        engine.handle("go movetime soon")
+        self.assertIsNone(engine.thread)
+        self.assertEqual(
+            out.getvalue().splitlines(),
+            ["info string invalid go limit depth x", "info string invalid go limit movetime soon"],
+        )
+
+
+class TestTournament(unittest.TestCase):
+    def test_elo_difference(self):
+        elo, error = elo_difference(6, 0, 2)
+        self.assertAlmostEqual(elo, 190.85, places=2)
+        elo, error = elo_difference(3, 2, 3)
+        self.assertEqual(elo, 0)
+        self.assertGreater(error, 0)
+
+    def test_tournament_plays_both_colors(self):
+        openings = random_openings(1, 2)
+        config = {"depth": 1, "use_pvs": True}
+        summary = run_tournament(config, {"depth": 1}, openings, workers=1, max_plies=6)
+        self.assertEqual(summary["wins"] + summary["draws"] + summary["losses"], 2)
+        self.assertGreater(summary["nps_a"], 0)
+        self.assertGreater(summary["seconds_per_move_b"], 0)
+        with self.assertRaises(ValueError):
+            play_game({"use_magic": True}, config, openings[0])
+
+
+class TestOpeningBook(unittest.TestCase):
+    def test_book_round_trip(self):
+        games = [
+            (REFERENCE_POSITIONS["opening"], "White", 0),
+            (REFERENCE_POSITIONS["middlegame"], None, 0),
+            (REFERENCE_POSITIONS["evolution"], "Black", 0),
+        ]
+        book = build_book(games)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "book.bin")
+            write_book(path, book)
+            opening_book = OpeningBook(path)
+            try:
+                start = setup_position([])
+                moves = opening_book.probe(start.board.hash)
+                # a2a4 won once and drew once, the losing e2f3 of the third game is left out.
+                self.assertEqual(moves, [(3, ((1, 0), (0, 0, (3, 0))))])
+                self.assertEqual(opening_book.choose_move(start)[1], (0, 0, (3, 0)))
+                reply = setup_position(REFERENCE_POSITIONS["evolution"][:1])
+                piece, move = opening_book.choose_move(reply)
+                self.assertEqual((piece.get_position(), move), ((6, 7), (0, 0, (5, 7))))
+                end = setup_position(REFERENCE_POSITIONS["baboons"])
+                self.assertIsNone(opening_book.choose_move(end))
+            finally:
+                opening_book.close()
+
+    def test_opening_plies_are_left_out(self):
+        moves = REFERENCE_POSITIONS["opening"]
+        book = build_book([(moves, "White", 2)])
+        self.assertNotIn(setup_position([]).board.hash, book)
+        self.assertNotIn(setup_position(moves[:1]).board.hash, book)
+        self.assertIn(setup_position(moves[:2]).board.hash, book)
+
+
+class TestTablebase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.tablebases = Tablebases(self.directory.name)
+        generate_table((), self.tablebases)
+
+    def tearDown(self):
+        self.tablebases.close()
+        self.directory.cleanup()
+
+    def game_with(self, pieces, turn):
+        codes = [0] * 64
+        for code, (row, col) in pieces:
+            codes[row * 8 + col] = code
+        game = Game(None)
+        game.load_board(Board.from_code_list(codes, turn))
+        return game
+
+    def test_tortoises_alone(self):
+        for white, black in (((3, 3), (4, 4)), ((0, 0), (7, 7)), ((2, 5), (2, 6))):
+            for turn in (0, 1):
+                with self.subTest(white=white, black=black, turn=turn):
+                    game = self.game_with([(TORTOISE, white), (-TORTOISE, black)], turn)
+                    score = self.tablebases.probe(game.board)
+                    best_score, _ = self.tablebases.best_move(game)
+                    self.assertEqual(score, best_score)
+                    adjacent = max(abs(white[0] - black[0]), abs(white[1] - black[1])) == 1
+                    expected = TABLEBASE_WIN - 1 if adjacent else 0
+                    self.assertEqual(score, expected if turn == 0 else -expected)
+
+    def test_search_probes_tables(self):
+        game = self.game_with([(TORTOISE, (3, 3)), (-TORTOISE, (4, 4))], 1)
+        game.tablebases = self.tablebases
+        score, (piece, move), depth = game.iterative_deepening(4, 60000, False)
+        self.assertEqual((score, move[2]), (1 - TABLEBASE_WIN, (4, 4)))
+        game = self.game_with([(TORTOISE, (0, 0)), (-TORTOISE, (7, 7))], 0)
+        game.tablebases = self.tablebases
+        self.assertEqual(game.minimax(3, -float("inf"), float("inf"), True, ply=1), (0, None))
+        game = self.game_with([(TORTOISE, (0, 0)), (-TORTOISE, (7, 7)), (MEERKAT, (0, 1))], 0)
+        game.tablebases = self.tablebases
+        self.assertIsNone(game.tablebases.probe(game.board))
+
+    def test_worker_games_share_tables_and_switches(self):
+        game = self.game_with([(TORTOISE, (3, 3)), (-TORTOISE, (4, 4))], 0)
+        game.tablebases = self.tablebases
+        game.use_lmr = True
+        worker_game = Game(None)
+        apply_settings(worker_game, search_settings(game))
+        try:
+            self.assertTrue(worker_game.use_lmr)
+            self.assertEqual(worker_game.tablebases.directory, self.directory.name)
+            self.assertEqual(
+                worker_game.tablebases.probe(game.board), self.tablebases.probe(game.board)
+            )
+        finally:
+            worker_game.tablebases.close()
+
+
+class TestTablebaseCaptures(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.tablebases = Tablebases(cls.directory.name)
+        generate_table((), cls.tablebases)
+        generate_table((CARACAL,), cls.tablebases)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tablebases.close()
+        cls.directory.cleanup()
+
+    def test_capture_beats_table_win(self):
+        codes = [0] * 64
+        for code, (row, col) in (
+            (TORTOISE, (0, 7)),
+            (-TORTOISE, (5, 5)),
+            (CARACAL, (3, 3)),
+            (-MEERKAT, (1, 1)),
+        ):
+            codes[row * 8 + col] = code
+        game = Game(None)
+        game.load_board(Board.from_code_list(codes, 1))
+        game.tablebases = self.tablebases
+        score, (piece, move), _ = game.iterative_deepening(3, 60000, False)
+        self.assertEqual((piece.get_position(), move[2]), ((3, 3), (5, 5)))
+        self.assertEqual(score, -(WIN_SCORE - 1))
+        self.assertLess(score, -TABLEBASE_WIN)
 
 
 if __name__ == "__main__":
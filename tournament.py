@@ -0,0 +1,220 @@
+import math
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from perft import setup_position
+from pieces import Tortoise
+
+# Game attributes an engine configuration may set besides "depth" and "time_ms".
+ENGINE_SWITCHES = (
+    "use_pvs",
+    "use_null_move",
+    "use_lmr",
+    "use_quiescence",
+    "aspiration_window",
+)
+DEFAULT_DEPTH = 4
+DEFAULT_TIME_MS = 1000
+MAX_PLIES = 200  # a game still running after this many plies is a draw
+REPETITIONS = 3  # a position reached this many times is a draw
+ELO_Z = 1.96  # error bars cover a 95% confidence interval
+
+
+def configure(game, config):
+    """Sets the search switches of an engine configuration on a game.
+    Returns: None."""
+    for switch, value in config.items():
+        if switch in ("name", "depth", "time_ms"):
+            continue
+        if switch not in ENGINE_SWITCHES:
+            raise ValueError(f"Unknown engine setting {switch!r}.")
+        setattr(game, switch, value)
+
+
+def random_openings(count, plies, seed=0):
+    """Plays random moves from the start position to get varied openings. Moves that
+    capture a Tortoise are never chosen, so every opening leaves a game to play.
+    Returns: List[List[Tuple[Position, Position, int]]] (count openings of (from, to,
+    evolve) moves, as taken by perft.setup_position)."""
+    rng = random.Random(seed)
+    openings = []
+    for _ in range(count):
+        game = setup_position([])
+        opening = []
+        for _ in range(plies):
+            color = game.get_current_player().get_color()
+            moves = [
+                (piece, move)
+                for piece, move in game.generate_moves(color)
+                if not isinstance(game.board.get_piece_at_pos(move[2]), Tortoise)
+            ]
+            if not moves:
+                break
+            piece, move = rng.choice(moves)
+            opening.append((piece.get_position(), move[2], move[1]))
+            game.make_move(piece, move)
+        openings.append(opening)
+    return openings
+
+
+def play_game(white, black, opening, max_plies=MAX_PLIES):
+    """Plays one game between two engine configurations from an opening. Each side
+    searches its own copy of the game, so the engines share no transposition table.
+    Returns: dict (the winner, "White", "Black" or None for a draw, the number of plies,
+    every (from, to, evolve) move from the start position including the opening, the
+    number of opening plies, and for each color the moves made, nodes searched and
+    seconds spent searching)."""
+    configs = {"White": white, "Black": black}
+    games = {}
+    for color, config in configs.items():
+        games[color] = setup_position(opening)
+        configure(games[color], config)
+    sides = {color: {"moves": 0, "nodes": 0, "seconds": 0.0} for color in configs}
+    seen = {}
+    moves = list(opening)
+
+    game = games["White"]
+    winner, plies = None, 0
+    while plies < max_plies:
+        seen[game.board.hash] = seen.get(game.board.hash, 0) + 1
+        if seen[game.board.hash] >= REPETITIONS:
+            break
+        color = game.get_current_player().get_color()
+        mover = games[color]
+        config = configs[color]
+        start_time = time.perf_counter()
+        _, best_move, _ = mover.iterative_deepening(
+            config.get("depth", DEFAULT_DEPTH),
+            config.get("time_ms", DEFAULT_TIME_MS),
+            color == "Black",
+        )
+        sides[color]["seconds"] += time.perf_counter() - start_time
+        sides[color]["nodes"] += mover.nodes
+        sides[color]["moves"] += 1
+        if best_move is None:
+            break
+
+        from_pos, move = best_move[0].get_position(), best_move[1]
+        plies += 1
+        moves.append((from_pos, move[2], move[1]))
+        for other in games.values():
+            ended = other.make_move(other.board.get_piece_at_pos(from_pos), move)
+        if ended:
+            winner = color
+            break
+
+    return {
+        "winner": winner,
+        "plies": plies,
+        "moves": moves,
+        "opening_plies": len(opening),
+        "sides": sides,
+    }
+
+
+def _play_pairing(job):
+    config_a, config_b, opening, a_is_white, max_plies = job
+    white, black = (config_a, config_b) if a_is_white else (config_b, config_a)
+    return a_is_white, play_game(white, black, opening, max_plies)
+
+
+def elo_difference(wins, draws, losses):
+    """Estimates the Elo difference from a match result, with the half-width of its
+    confidence interval from the spread of the game scores.
+    Returns: Tuple[float, float] (Elo difference and error bar, infinite when one side
+    scored every point)."""
+    games = wins + draws + losses
+    if games == 0:
+        return 0.0, math.inf
+    score = (wins + draws / 2) / games
+    deviation = math.sqrt(
+        (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score**2) / games
+    )
+    margin = ELO_Z * deviation / math.sqrt(games)
+
+    def elo(p):
+        if p <= 0:
+            return -math.inf
+        if p >= 1:
+            return math.inf
+        return -400 * math.log10(1 / p - 1) + 0.0  # no negative zero for an even score
+
+    low, high = elo(score - margin), elo(score + margin)
+    return elo(score), (high - low) / 2
+
+
+def play_pairings(config_a, config_b, openings, workers=1, max_plies=MAX_PLIES):
+    """Plays every opening twice, once with each configuration as White, spreading
+    the games over a pool of worker processes.
+    Returns: List[Tuple[bool, dict]] (whether config_a had White, and the result of
+    play_game, for every game)."""
+    jobs = [
+        (config_a, config_b, opening, a_is_white, max_plies)
+        for opening in openings
+        for a_is_white in (True, False)
+    ]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(_play_pairing, jobs))
+
+
+def run_tournament(config_a, config_b, openings, workers=1, max_plies=MAX_PLIES):
+    """Plays a match between two configurations with play_pairings.
+    Returns: dict (wins, draws and losses of config_a, the Elo difference of config_a
+    over config_b with its error bar, and the nodes per second and seconds per move of
+    each configuration)."""
+    results = play_pairings(config_a, config_b, openings, workers, max_plies)
+
+    wins = draws = losses = 0
+    totals = {label: {"moves": 0, "nodes": 0, "seconds": 0.0} for label in ("a", "b")}
+    for a_is_white, result in results:
+        a_color = "White" if a_is_white else "Black"
+        if result["winner"] is None:
+            draws += 1
+        elif result["winner"] == a_color:
+            wins += 1
+        else:
+            losses += 1
+        for color, side in result["sides"].items():
+            total = totals["a" if color == a_color else "b"]
+            for field in total:
+                total[field] += side[field]
+
+    elo, elo_error = elo_difference(wins, draws, losses)
+    summary = {"wins": wins, "draws": draws, "losses": losses, "elo": elo, "elo_error": elo_error}
+    for label, total in totals.items():
+        seconds, moves = total["seconds"], total["moves"]
+        summary[f"nps_{label}"] = total["nodes"] / seconds if seconds > 0 else 0.0
+        summary[f"seconds_per_move_{label}"] = seconds / moves if moves else 0.0
+    return summary
+
+
+def report(config_a, config_b, summary, out=sys.stdout):
+    """Prints a tournament summary.
+    Returns: None."""
+    name_a = config_a.get("name", "A")
+    name_b = config_b.get("name", "B")
+    print(
+        f"{name_a} vs {name_b}: +{summary['wins']} ={summary['draws']} -{summary['losses']}, "
+        f"Elo {summary['elo']:+.0f} +/- {summary['elo_error']:.0f}",
+        file=out,
+    )
+    for label, name in (("a", name_a), ("b", name_b)):
+        print(
+            f"  {name}: {summary[f'nps_{label}']:,.0f} nps, "
+            f"{summary[f'seconds_per_move_{label}'] * 1000:.0f} ms per move",
+            file=out,
+        )
+
+
+if __name__ == "__main__":
+    from search_stats import SETTINGS
+
+    setting_a = sys.argv[1] if len(sys.argv) > 1 else "all"
+    setting_b = sys.argv[2] if len(sys.argv) > 2 else "alpha-beta"
+    opening_count = int(sys.argv[3]) if len(sys.argv) > 3 else 8
+    workers = int(sys.argv[4]) if len(sys.argv) > 4 else 4
+    config_a = dict(SETTINGS[setting_a], name=setting_a)
+    config_b = dict(SETTINGS[setting_b], name=setting_b)
+    openings = random_openings(opening_count, 4)
+    report(config_a, config_b, run_tournament(config_a, config_b, openings, workers))
@@ -0,0 +1,187 @@
+import random
+import struct
+from multiprocessing import shared_memory
+from pieces import QUIET_MOVES, CAPTURE_MOVES, QUIET_EVOLVE_MOVES, CAPTURE_EVOLVE_MOVES
+
+EXACT = 0
+LOWER_BOUND = 1
+UPPER_BOUND = 2
+
+PIECE_TYPES = ["mandrill", "baboon", "python", "giraffe", "meerkat", "tortoise", "caracal"]
+COLORS = ["White", "Black"]
+
+# Fixed seed so that position hashes are stable between runs.
+_rng = random.Random(0x5AFA12)
+
+ZOBRIST_PIECES = {
+    (piece_type, color): [_rng.getrandbits(64) for _ in range(64)]
+    for piece_type in PIECE_TYPES
+    for color in COLORS
+}
+ZOBRIST_BLACK_TO_MOVE = _rng.getrandbits(64)
+
+# Move triples by [capture][evolve][0x88 square], used to unpack shared entries.
+MOVES = [[QUIET_MOVES, QUIET_EVOLVE_MOVES], [CAPTURE_MOVES, CAPTURE_EVOLVE_MOVES]]
+
+
+def piece_key(piece, position):
+    """Gets the Zobrist key of a piece standing on a position.
+    Returns: int (64-bit key covering piece type, evolved state, color and square)."""
+    keys = ZOBRIST_PIECES[(piece.piece_type, piece.get_color())]
+    return keys[position[0] * 8 + position[1]]
+
+
+class TranspositionTable:
+    """Fixed-size table of search results keyed by Zobrist hash.
+
+    Entries are tuples (key, depth, score, flag, move, generation) where move is
+    (from_position, (capture, evolve, to_position)). A slot is overwritten when it
+    is empty, was written during an older search, or the new result is at least
+    as deep as the stored one.
+    """
+
+    def __init__(self, size=1 << 18):
+        if size & (size - 1):
+            raise ValueError("Transposition table size must be a power of two.")
+        self.size = size
+        self.mask = size - 1
+        self.entries = [None] * size
+        self.generation = 0
+
+    def clear(self):
+        """Removes every entry from the table.
+        Returns: None."""
+        self.entries = [None] * self.size
+        self.generation = 0
+
+    def new_search(self):
+        """Marks the start of a new search so older entries become replaceable.
+        Returns: None."""
+        self.generation += 1
+
+    def probe(self, key):
+        """Looks up the entry stored for a position.
+        Returns: Tuple (the stored entry, or None if the position is not in the table)."""
+        entry = self.entries[key & self.mask]
+        if entry is not None and entry[0] == key:
+            return entry
+        return None
+
+    def store(self, key, depth, score, flag, move):
+        """Stores a search result, following the replacement policy.
+        Returns: None."""
+        index = key & self.mask
+        entry = self.entries[index]
+        if entry is None or entry[5] != self.generation or depth >= entry[1]:
+            self.entries[index] = (key, depth, score, flag, move, self.generation)
+
+
+class SharedTranspositionTable:
+    """Transposition table in shared memory, shared by several search processes.
+
+    Each slot is three 64-bit words: the score, the packed depth, flag,
+    generation and move, and the key XOR-ed with both. Writers do not lock, so a
+    reader may see a slot that is being overwritten; its words then no longer
+    XOR back to the key and the slot is treated as empty. Word 0 of the block
+    holds the search generation, which only the process that created the
+    table advances.
+    """
+
+    WORDS_PER_ENTRY = 3
+
+    def __init__(self, size=1 << 18, name=None):
+        if size & (size - 1):
+            raise ValueError("Transposition table size must be a power of two.")
+        self.size = size
+        self.mask = size - 1
+        nbytes = (1 + size * self.WORDS_PER_ENTRY) * 8
+        self.owner = name is None
+        if self.owner:
+            self.shm = shared_memory.SharedMemory(create=True, size=nbytes)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.nbytes = nbytes
+        self.words = self.shm.buf[:nbytes].cast("Q")
+        self.scores = self.shm.buf[:nbytes].cast("d")
+
+    @property
+    def generation(self):
+        return self.words[0]
+
+    def close(self):
+        """Detaches this process from the shared memory.
+        Returns: None."""
+        self.words.release()
+        self.scores.release()
+        self.shm.close()
+
+    def unlink(self):
+        """Frees the shared memory once every process has closed it.
+        Returns: None."""
+        self.shm.unlink()
+
+    def clear(self):
+        """Removes every entry from the table.
+        Returns: None."""
+        self.shm.buf[: self.nbytes] = bytes(self.nbytes)
+
+    def new_search(self):
+        """Marks the start of a new search so older entries become replaceable.
+        Does nothing in processes that attached to the table by name.
+        Returns: None."""
+        if self.owner:
+            self.words[0] = (self.words[0] + 1) & 0xFF
+
+    def probe(self, key):
+        """Looks up the entry stored for a position.
+        Returns: Tuple (the stored entry, or None if the position is not in the table or torn)."""
+        base = 1 + (key & self.mask) * self.WORDS_PER_ENTRY
+        words = self.words
+        check, score_bits, data = words[base], words[base + 1], words[base + 2]
+        # The score is decoded from the words just checked, as it may change if read again.
+        if data == 0 or check ^ score_bits ^ data != key:
+            return None
+        move = None
+        if data >> 18 & 1:
+            from_square = data >> 19 & 63
+            to_square = data >> 25 & 63
+            move = (
+                (from_square >> 3, from_square & 7),
+                MOVES[data >> 31 & 1][data >> 32 & 1][(to_square >> 3) * 16 + (to_square & 7)],
+            )
+        return (
+            key,
+            data & 0xFF,
+            struct.unpack("=d", struct.pack("=Q", score_bits))[0],
+            data >> 8 & 3,
+            move,
+            data >> 10 & 0xFF,
+        )
+
+    def store(self, key, depth, score, flag, move):
+        """Stores a search result, following the replacement policy of TranspositionTable.
+        Returns: None."""
+        base = 1 + (key & self.mask) * self.WORDS_PER_ENTRY
+        words = self.words
+        generation = words[0]
+        old_data = words[base + 2]
+        if (
+            old_data != 0
+            and old_data >> 10 & 0xFF == generation
+            and depth < old_data & 0xFF
+        ):
+            return
+
+        data = depth & 0xFF | flag << 8 | generation << 10
+        if move is not None:
+            (from_row, from_col), (capture, evolve, (to_row, to_col)) = move
+            data |= (
+                1 << 18
+                | (from_row * 8 + from_col) << 19
+                | (to_row * 8 + to_col) << 25
+                | capture << 31
+                | evolve << 32
+            )
+        self.scores[base + 1] = score
+        words[base + 2] = data
+        words[base] = key ^ words[base + 1] ^ data